@@ -0,0 +1,114 @@
+# Render cube states to image files without a GUI.
+#
+# A job is a tuple (N, moves, rot, fname):
+#
+#     N      cube size
+#     moves  a sequence in the apply_string format ("F * (D)^-1 * R2"),
+#            or a list of (face, turns, layer) moves
+#     rot    view rotation: a projection.Quaternion, its 4 components,
+#            or None for InteractiveCube's starting view
+#     fname  image file to write
+#
+# render_batch runs a list of jobs on a process pool.  Each worker draws
+# with the Agg backend directly (no pyplot, no windows) and reuses one
+# figure for all of its jobs:
+#
+#     render_batch(opp_jobs(3))    # every {N}Opp{k}.png at once
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+
+from cube_interactive import Cube, cube_polygons, opps, parse_ops
+from projection import Quaternion
+
+
+start_rot = Quaternion.from_v_theta((1, -1, 0), -np.pi / 6)
+view = (0, 0, 10)
+
+# The figure this process draws on; see _setup.
+_figure = None
+
+
+def _setup(size=(5, 5), dpi=100):
+    global _figure
+
+    fig = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1], aspect='equal', xlim=(-2.0, 2.0),
+                      ylim=(-2.0, 2.0), frameon=False, xticks=[], yticks=[])
+    ax.add_collection(PolyCollection([], linewidths=0.5))
+    _figure = fig
+
+
+def apply_moves(cube, moves):
+    if isinstance(moves, str):
+        moves = [(face, dir, 0) for face, dir in parse_ops(moves)]
+
+    for face, turns, layer in moves:
+        cube.rotate_face(face, turns, layer)
+
+
+def render_job(job):
+    """Draw one job and write its image; returns the file name."""
+    N, moves, rot, fname = job
+    if _figure is None:
+        _setup()
+
+    cube = Cube(N, logical=True)
+    apply_moves(cube, moves)
+    cube._sync_geometry()
+
+    if rot is None:
+        rot = start_rot
+    elif not isinstance(rot, Quaternion):
+        rot = Quaternion(rot)
+
+    verts, colors, edges, centroids, visible = cube_polygons(cube, rot, view)
+    polys = _figure.axes[0].collections[0]
+    polys.set_verts(verts)
+    polys.set_facecolor(colors)
+    polys.set_edgecolor(edges)
+    _figure.savefig(fname)
+
+    return fname
+
+
+def render_batch(jobs, workers=None, size=(5, 5), dpi=100, chunksize=16):
+    """Render every job, spread over `workers` processes.
+
+    workers=None uses one per CPU; workers=1 renders in this process.
+    Returns the file names written, in job order.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers == 1:
+        _setup(size, dpi)
+        return [render_job(job) for job in jobs]
+
+    with ProcessPoolExecutor(workers, initializer=_setup,
+                             initargs=(size, dpi)) as pool:
+        return list(pool.map(render_job, jobs, chunksize=chunksize))
+
+
+def opp_jobs(N, rot=None):
+    """Jobs for the images apply_opps saves, {N}Opp{k}.png."""
+    return [(N, s, rot, "{0}Opp{1}.png".format(N, k))
+            for k, s in enumerate(opps)]
+
+
+if __name__ == '__main__':
+    import sys
+
+    try:
+        N = int(sys.argv[1])
+    except:
+        N = 3
+
+    for fname in render_batch(opp_jobs(N)):
+        print(fname)
@@ -8,16 +8,18 @@
 # http://kociemba.org/computervision.html
 
 from __future__ import annotations
-from msilib import sequence
-from tkinter.ttk import LabeledScale
-from xml.sax.handler import feature_string_interning
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import widgets
+from matplotlib.backend_bases import TimerBase
 from matplotlib.patches import Rectangle, PathPatch
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba, to_rgba_array
 from matplotlib.text import TextPath
 from matplotlib.transforms import Affine2D
-from projection import Quaternion, project_points
+from matplotlib.path import Path
+from projection import Quaternion, project_points, turn_matrix
+from perm_group import PermGroup
 
 
 labels3x3 = {
@@ -77,8 +79,13 @@ labels3x3 = {
 53: 	19,
     }
 
-def translateid(faceid):
-    if N == 3:
+# Cube size assumed by the label helpers below when none is given;
+# __main__ sets it from the command line.
+N = 3
+
+
+def translateid(faceid, n=None):
+    if (N if n is None else n) == 3:
         return labels3x3[faceid - 1]
     else:
         return faceid
@@ -241,8 +248,13 @@ class Cube:
                      R=x, L=-x,
                      U=y, D=-y)
 
-    def __init__(self, N=3, plastic_color=None, face_colors=None):
+    # Quarter-turn index arrays for logical cubes, keyed by (N, face, layer)
+    _quarter_turns = {}
+
+    def __init__(self, N=3, plastic_color=None, face_colors=None,
+                 logical=False):
         self.N = N
+        self.logical = logical
         if plastic_color is None:
             self.plastic_color = self.default_plastic_color
         else:
@@ -256,6 +268,23 @@ class Cube:
         self._move_list = []
         self._initialize_arrays()
 
+        # Dirty tracking: _changed[i] is the _version at which sticker i's
+        # geometry last changed, so a drawer that remembers the version it
+        # last saw knows which stickers to project again.
+        self._version = 0
+        self._changed = np.zeros(len(self._colors), dtype=int)
+
+        if logical:
+            # The state is a permutation: sticker i sits in the slot that
+            # sticker _perm[i] occupies on a solved cube.  Geometry is
+            # derived from it by _sync_geometry when it is needed, for the
+            # stickers marked in _unsynced.
+            self._perm = np.arange(len(self._colors))
+            self._home = (self._face_centroids.copy(), self._faces.copy(),
+                          self._sticker_centroids.copy(),
+                          self._stickers.copy())
+            self._unsynced = np.zeros(len(self._colors), dtype=bool)
+
     def _initialize_arrays(self):
         # initialize centroids, faces, and stickers.  We start with a
         # base for each one, and then translate & rotate them into position.
@@ -316,41 +345,73 @@ class Cube:
         self._colors = self._colors[ind]
         self._faces = self._faces[ind]
 
+    # Grid used to turn sticker coordinates into integer keys for match.
+    # The grid is offset by an awkward fraction of a cell so that the
+    # round numbers sticker corners sit on never land on a cell edge.
+    match_step = 1e-3
+    match_shift = 0.318
+
+    def _match_keys(self):
+        """One bytes key per sticker: the quantized centroid followed by the
+        sorted, quantized offsets of its corners from the centroid (an
+        orientation signature that does not depend on corner order)."""
+        pts = self._stickers[:, :8]
+        centroids = pts.mean(1)
+        offsets = pts - centroids[:, None, :]
+
+        cq = np.floor(centroids / self.match_step + self.match_shift)
+        oq = np.floor(offsets / self.match_step + self.match_shift)
+        oq = oq.astype(np.int64) + (1 << 15)
+        codes = np.sort((oq[..., 0] << 32) + (oq[..., 1] << 16) + oq[..., 2],
+                        axis=1)
+
+        keys = np.hstack([cq.astype(np.int64), codes])
+        return [row.tobytes() for row in keys]
+
+    def _match_slow(self, s, other):
+        # The original test: every corner of sticker s is within tolerance
+        # of some corner of the other sticker.
+        close = np.isclose(self._stickers[s, None, :, None, :],
+                           other._stickers[:, None, :, :], .01, .01)
+        hits = close.all(-1).any(-1).all(-1)
+        found = np.flatnonzero(hits)
+        if len(found):
+            return found[0]
+
+        return None
+
     def match(self, other):
-        
-        result = []
+        """Find where each sticker of this cube sits in other.
+
+        Returns a list whose entry s is one more than the index of the
+        sticker of other that occupies the same place as sticker s, or
+        None if some sticker has no partner.  Stickers are paired by
+        looking up integer keys (see _match_keys) in a dict, so this is
+        linear in the number of stickers; keys that miss fall back to a
+        tolerance test against every sticker.
+        """
+        self._sync_geometry()
+        other._sync_geometry()
+
+        lookup = {}
+        for t, key in enumerate(other._match_keys()):
+            lookup.setdefault(key, t)
 
-        for s in range(self.N * self.N * 6):
-            match = False
-            for t in range(self.N * self.N * 6):
-
-                cmatch = True
-                for i in range(9):
-                    pmatch = False
-                    for j in range(9):
-                        if np.allclose(self._stickers[s,i], other._stickers[t,j], .01, .01):
-                            pmatch = True
-                            break
-
-                    if pmatch == False:
-                        cmatch = False
-                        break
-
-                if cmatch == True:
-                    match = True
-                    #print(s, t)
-                    result.append(t + 1)
-                    break
-
-            if match == False:
+        result = []
+        for s, key in enumerate(self._match_keys()):
+            t = lookup.get(key)
+            if t is None:
+                t = self._match_slow(s, other)
+            if t is None:
                 print ("No match for ", s)
+                continue
+            result.append(t + 1)
 
         if len(result) == self.N * self.N * 6:
             return result
 
         return None
 
-
     def rotate_face(self, f, n=1, layer=0):
         """Rotate Face"""
         if layer < 0 or layer >= self.N:
@@ -371,15 +432,70 @@ class Cube:
                 self._move_list[-1] = (f, ntot, layer)
         else:
             self._move_list.append((f, n, layer))
-        
-        v = self.facesdict[f]
-        r = Quaternion.from_v_theta(v, n * np.pi / 2)
-        M = r.as_rotation_matrix()
 
-        proj = np.dot(self._face_centroids[:, :3], v)
-        cubie_width = 2. / self.N
-        flag = ((proj > 0.9 - (layer + 1) * cubie_width) &
-                (proj < 1.1 - layer * cubie_width))
+        if not self.logical:
+            self._rotate_geometry(f, n, layer)
+            return
+
+        if not np.allclose(n, np.round(n)):
+            raise ValueError('a logical cube only turns by whole quarter turns')
+        q = self._quarter_turn(self.N, f, layer)
+        perm = self._perm
+        for i in range(int(np.round(n)) % 4):
+            perm = q[perm]
+        self._unsynced |= perm != self._perm
+        self._perm = perm
+
+    @classmethod
+    def _quarter_turn(cls, N, f, layer):
+        """Index array q such that a clockwise quarter turn moves the
+        sticker in slot i to slot q[i].  Built once per (N, f, layer) by
+        turning a solved cube's geometry and matching it to the original."""
+        key = (N, f, layer)
+        if key not in cls._quarter_turns:
+            turned = cls(N)
+            turned._rotate_geometry(f, 1, layer)
+            q = np.array(turned.match(cls(N))) - 1
+            q.flags.writeable = False
+            cls._quarter_turns[key] = q
+
+        return cls._quarter_turns[key]
+
+    def _sync_geometry(self):
+        """Bring the geometry arrays of a logical cube up to date with its
+        state, for the stickers that have moved since the last call."""
+        if not self.logical or not self._unsynced.any():
+            return
+
+        face_centroids, faces, sticker_centroids, stickers = self._home
+        rows = self._unsynced
+        idx = self._perm[rows]
+        # the last column is the sticker's own face ID, which travels with it
+        self._face_centroids[rows, :3] = face_centroids[idx, :3]
+        self._faces[rows] = faces[idx]
+        self._sticker_centroids[rows] = sticker_centroids[idx]
+        self._stickers[rows] = stickers[idx]
+        self._mark(rows)
+        self._unsynced[:] = False
+
+    def _mark(self, rows):
+        self._version += 1
+        self._changed[rows] = self._version
+
+    def changed_since(self, version):
+        """True for each sticker whose geometry changed after version."""
+        return self._changed > version
+
+    def _rotate_geometry(self, f, n=1, layer=0):
+        # Turn the layer's geometry by n quarter turns.  On a logical cube
+        # this is only a transient view: the state is unchanged and the
+        # next _sync_geometry undoes it.
+        self._sync_geometry()
+        M = turn_matrix(self.facesdict[f], n)
+        flag = self._layer_mask(f, layer)
+        self._mark(flag)
+        if self.logical:
+            self._unsynced |= flag
 
         for x in [self._stickers, self._sticker_centroids,
                   self._faces]:
@@ -387,24 +503,353 @@ class Cube:
         self._face_centroids[flag, :3] = np.dot(self._face_centroids[flag, :3],
                                                 M.T)
 
+    def _layer_mask(self, f, layer):
+        """True for each sticker in the given layer below face f."""
+        proj = np.dot(self._face_centroids[:, :3], self.facesdict[f])
+        cubie_width = 2. / self.N
+        return ((proj > 0.9 - (layer + 1) * cubie_width) &
+                (proj < 1.1 - layer * cubie_width))
+
+    def turn_frames(self, f, n=1, layer=0, steps=5):
+        """Geometry for an animated turn, without changing the cube.
+
+        Returns (mask, faces, stickers, face_centroids, sticker_centroids):
+        mask is True for the K stickers of the turning layer, and the
+        arrays hold just those rows at the positions 1/steps, 2/steps,
+        ..., 1 of the way through turning the layer by n quarter turns,
+        each with a leading axis of length steps; stickers is
+        (steps, K, 9, 3).  The rest of the cube stays where it is, so it
+        is not copied.  All the steps are rotated in one batch.
+        """
+        self._sync_geometry()
+        flag = self._layer_mask(f, layer)
+        v = self.facesdict[f]
+        Ms = np.array([turn_matrix(v, n * i / steps)
+                       for i in range(1, steps + 1)])
+
+        frames = [flag]
+        for x in [self._faces, self._stickers, self._face_centroids[:, :3],
+                  self._sticker_centroids]:
+            frames.append(np.einsum('sij,...j->s...i', Ms, x[flag]))
+
+        return tuple(frames)
+
     def draw_interactive(self):
         fig = plt.figure(figsize=(5, 5))
         fig.add_axes(InteractiveCube(self))
         return fig
 
 
+def face_generators(N):
+    """Sticker permutations of a clockwise quarter turn of each face.
+
+    Entry i of each is the sticker slot (counting from 0) that sticker i
+    moves to; see perm_group.py.
+    """
+    base_cube = Cube(N)
+    generators = []
+    for face in "UDLRBF":
+        oc = Cube(N)
+        oc.rotate_face(face, 1)
+        generators.append([t - 1 for t in oc.match(base_cube)])
+
+    return generators
+
+
+# The sequences the 'Opp' button steps through.
+opps = [
+    "L * (B)^-1 * L * (B)^-1 * (R)^-1 * (U)^-1 * R * B2 * L2 * D * F * D * F * (D)^-1 * (F)^-1 * (D)^-1",
+    "F * (D)^-1 * F * D * (F)^-1 * R2 * (D)^-1 * (B)^-1 * D * B * R2 * D * F * D2 * (F)^-1 * D * (F)^-1",
+    "F * R * F * (R)^-1 * (D)^-1 * (F)^-1 * L * D * (L)^-1 * D * L * D2 * (L)^-1 * D2 * F * D * R * (F)^-1 * (R)^-1 * D2 * (F)^-1 * (D)^-1 * F * (D)^-1 * (F)^-1 * D2",
+    "(D)^-1 * F * D * (F)^-1 * R2 * (D)^-1 * (B)^-1 * D * B * R2 * D * F * D2 * (F)^-1 * D",
+    "F * R * F * (R)^-1 * (F)^-1 * L * F2 * (D)^-1 * (F)^-1 * R * (F)^-1 * (R)^-1 * (L)^-1",
+    "F * B2 * D * (F)^-1 * (D)^-1 * B2 * D2 * (R)^-1 * (D)^-1 * F * (D)^-1 * (F)^-1",
+    "F * D * R * F * (R)^-1 * (D)^-1 * (F)^-1 * D * F * D * (F)^-1 * D * F * D * (F)^-1",
+]
+
+
+def parse_ops(s):
+    """Quarter turns for a sequence like "F * (D)^-1 * R2".
+
+    Returns a list of (face, direction) pairs, one per quarter turn.
+    """
+    turns = []
+    for op in s.split(" * "):
+        if op[0] == '(':
+            face = op[1]
+            count = 1
+            dir = -1
+        else:
+            face = op[0]
+            if len(op) > 1:
+                count = int(op[1])
+            else:
+                count = 1
+            dir = 1
+
+        turns += [(face, dir)] * count
+
+    return turns
+
+
+def facing(frame, rot, view=(0, 0, 10)):
+    """True for each sticker whose front faces the viewer.
+
+    frame is (faces, stickers, face_centroids, sticker_centroids), for
+    the whole cube or for the turning layer in one step of
+    Cube.turn_frames.  Each sticker's normal is taken from its own
+    centroids, so stickers of a turning layer are judged by where they
+    are, not by the face they started on.
+    """
+    face_centroids, sticker_centroids = frame[2:]
+    normals = sticker_centroids - face_centroids
+    # the viewer's position, in the cube's frame
+    eye = np.dot(rot.as_rotation_matrix().T, view)
+    return ((eye - sticker_centroids) * normals).sum(1) > 0
+
+
+class CubeProjection:
+    """A cube's faces and stickers, projected for drawing.
+
+    The 2D polygons are kept between calls.  After a face turn only the
+    stickers that moved are projected again, and after a view rotation
+    only the vertices are; colors are worked out once.
+
+    Parameters
+    ----------
+    cube : Cube
+    view : length-3 vector giving the point of view
+    """
+    def __init__(self, cube, view=(0, 0, 10)):
+        self.cube = cube
+        self.view = view
+        self.projected = 0  # stickers projected by the last call
+
+        K = len(cube._colors)
+        V = cube._stickers.shape[1]
+        self._rot = None
+        self._version = -1
+        self._known = np.zeros(K, dtype=bool)
+        self._faces = np.zeros((K, V, 2))
+        self._stickers = np.zeros((K, V, 2))
+        self._face_depths = np.zeros(K)
+        self._centroids = np.zeros((K, 3))
+
+        self._plastic = to_rgba(cube.plastic_color)
+        self._colors = to_rgba_array(np.asarray(cube.face_colors)[cube._colors])
+
+    def _project(self, frame, rows, rot):
+        project = lambda pts: project_points(pts, rot, self.view, [0, 1, 0])
+        faces, stickers, face_centroids, sticker_centroids = frame
+
+        faces = project(faces[rows])[:, :, :2]
+        pad = stickers.shape[1] - faces.shape[1]
+        faces = np.concatenate([faces, faces[:, -1:].repeat(pad, 1)], 1)
+        return (faces, project(stickers[rows])[:, :, :2],
+                project(face_centroids[rows])[:, 2],
+                project(sticker_centroids[rows]))
+
+    def polygons(self, rot, frame=None):
+        """Project the cube for drawing.
+
+        Returns the 2D polygons of the faces and stickers that face the
+        viewer, in the order to draw them (furthest first), their RGBA
+        face and edge colors in the same order, the projected centroids of
+        the stickers (only meaningful where visible), and the mask of which
+        stickers face the viewer.  Stickers facing away are hidden by the
+        rest of the cube, so they are neither projected nor drawn; the
+        plastic faces behind them are kept while drawing an animation
+        frame.  Faces are padded out to the sticker's vertex count by
+        repeating their last vertex, so all of them fit in one
+        PolyCollection.  Faces are edged in the plastic color to close the
+        antialiasing seams between them that the culled faces used to fill.
+
+        frame is one step of Cube.turn_frames, (mask, faces, stickers,
+        face_centroids, sticker_centroids); its rows are drawn in place of
+        the cube's own geometry for the stickers in mask.
+        """
+        cube = self.cube
+        cube._sync_geometry()
+        if rot is not self._rot:
+            self._known[:] = False
+            self._rot = rot
+        self._known &= ~cube.changed_since(self._version)
+        self._version = cube._version
+
+        geometry = (cube._faces, cube._stickers, cube._face_centroids[:, :3],
+                    cube._sticker_centroids)
+        if frame is None:
+            moving = np.zeros(len(self._known), dtype=bool)
+            solid = visible = facing(geometry, rot, self.view)
+        else:
+            # While a layer turns, the gap it opens shows the plastic behind.
+            moving, frame = frame[0], frame[1:]
+            visible = facing(geometry, rot, self.view)
+            visible[moving] = facing(frame, rot, self.view)
+            solid = np.ones_like(visible)
+
+        # Stickers in place come from the cache, filled in as needed;
+        # those the frame moves are projected for this call only.
+        rows = solid & ~moving & ~self._known
+        (self._faces[rows], self._stickers[rows], self._face_depths[rows],
+         self._centroids[rows]) = self._project(geometry, rows, rot)
+        self._known |= rows
+        self.projected = rows.sum() + moving.sum()
+
+        faces, stickers = self._faces, self._stickers
+        face_depths, centroids = self._face_depths, self._centroids
+        if moving.any():
+            faces, stickers = faces.copy(), stickers.copy()
+            face_depths, centroids = face_depths.copy(), centroids.copy()
+            (faces[moving], stickers[moving], face_depths[moving],
+             centroids[moving]) = self._project(frame, slice(None), rot)
+
+        K = visible.sum()
+        verts = np.concatenate([faces[solid], stickers[visible]])
+        plastic = np.broadcast_to(self._plastic, (solid.sum(), 4))
+        colors = np.concatenate([plastic, self._colors[visible]])
+        edges = np.concatenate([plastic, np.zeros((K, 4))])
+
+        # painter's algorithm: largest depth first
+        depths = np.concatenate([face_depths[solid], centroids[visible, 2]])
+        order = np.argsort(-depths, kind='stable')
+
+        return (verts[order], colors[order], edges[order],
+                centroids[:, :2], visible)
+
+
+def cube_polygons(cube, rot, view=(0, 0, 10), frame=None):
+    """CubeProjection(cube, view).polygons(rot, frame), for one-off use."""
+    return CubeProjection(cube, view).polygons(rot, frame)
+
+
+class StickerLabels:
+    """The sticker numbers shown over an InteractiveCube.
+
+    mode is one of
+        'off'      no labels
+        'hover'    one label, for the sticker under the mouse; toggle()
+                   shows them all
+        'batched'  every visible sticker's label
+
+    Labels are not Text artists.  Each label's glyph outlines come from
+    TextPath once, and all the shown labels are drawn as a single path,
+    moved to the sticker centroids with one vectorised add per frame.
+    """
+    modes = ('off', 'hover', 'batched')
+
+    # glyph outlines, centred on (0, 0), keyed by (text, size)
+    _glyphs = {}
+
+    def __init__(self, ax, N, mode='batched', animated=False):
+        if mode not in self.modes:
+            raise ValueError('mode should be one of {0}'.format(self.modes))
+        self.ax = ax
+        self.mode = mode
+        self.show_all = mode == 'batched'
+        self.hover_index = None
+        self.texts = [str(translateid(i + 1, N)) for i in range(6 * N * N)]
+        self.size = 0.4 / max(N, 3)
+        self.cubie_width = 2. / N
+
+        vertices = []
+        codes = []
+        owners = []
+        for i, text in enumerate(self.texts):
+            v, c = self._glyph(text, self.size)
+            vertices.append(v)
+            codes.append(c)
+            owners.append(np.full(len(v), i))
+        self._vertices = np.concatenate(vertices)
+        self._codes = np.concatenate(codes)
+        self._owners = np.concatenate(owners)
+
+        self.centroids = np.zeros((len(self.texts), 2))
+        self.visible = np.zeros(len(self.texts), dtype=bool)
+
+        self._patch = PathPatch(Path(np.zeros((1, 2)), [Path.MOVETO]),
+                                facecolor='black', edgecolor='none',
+                                animated=animated)
+        self._hover = ax.text(0, 0, '', ha='center', va='center',
+                              visible=False, animated=animated)
+        ax.add_patch(self._patch)
+
+    @classmethod
+    def _glyph(cls, text, size):
+        key = (text, size)
+        if key not in cls._glyphs:
+            path = TextPath((0, 0), text, size=size)
+            v = path.vertices
+            v = v - (v.min(0) + v.max(0)) / 2
+            cls._glyphs[key] = (v, path.codes)
+
+        return cls._glyphs[key]
+
+    def artists(self):
+        return [self._patch, self._hover]
+
+    def update(self, centroids, visible):
+        """Move the labels to the projected sticker centroids; only the
+        visible stickers' labels are shown."""
+        self.centroids = centroids
+        self.visible = visible
+
+        shown = visible[self._owners] & self.show_all
+        if shown.any():
+            owners = self._owners[shown]
+            path = Path(self._vertices[shown] + centroids[owners],
+                        self._codes[shown])
+        else:
+            path = Path(np.zeros((1, 2)), [Path.MOVETO])
+        self._patch.set_path(path)
+
+        self._place_hover()
+
+    def hover(self, x, y):
+        """Show the label of the visible sticker nearest (x, y), if there
+        is one within a cubie of it.  Returns True if the label changed."""
+        index = None
+        if self.mode == 'hover' and x is not None and self.visible.any():
+            candidates = np.flatnonzero(self.visible)
+            d = np.hypot(*(self.centroids[candidates] - (x, y)).T)
+            if d.min() < self.cubie_width / 2:
+                index = candidates[d.argmin()]
+
+        changed = index != self.hover_index
+        self.hover_index = index
+        self._place_hover()
+        return changed
+
+    def _place_hover(self):
+        i = self.hover_index
+        if i is None or not self.visible[i] or self.show_all:
+            self._hover.set_visible(False)
+            return
+
+        self._hover.set_text(self.texts[i])
+        self._hover.set_position(self.centroids[i])
+        self._hover.set_visible(True)
+
+    def toggle(self):
+        """Switch between showing every label and only the hovered one."""
+        if self.mode == 'hover':
+            self.show_all = not self.show_all
+            self.update(self.centroids, self.visible)
+
+
 class InteractiveCube(plt.Axes):
     def __init__(self, cube=None,
                  interactive=True,
                  view=(0, 0, 10),
                  fig=None, rect=[0, 0.16, 1, 0.84],
+                 blit=True, fps='auto', labels='batched',
                  **kwargs):
         if cube is None:
-            self.cube = Cube(3)
+            self.cube = Cube(3, logical=True)
         elif isinstance(cube, Cube):
             self.cube = cube
         else:
-            self.cube = Cube(cube)
+            self.cube = Cube(cube, logical=True)
 
         self._view = view
         self._start_rot = Quaternion.from_v_theta((1, -1, 0),
@@ -450,9 +895,41 @@ class InteractiveCube(plt.Axes):
         self._digit_flags = np.zeros(10, dtype=bool)  # digits 0-9 pressed
 
         self._current_rot = self._start_rot  #current rotation state
-        self._face_polys = None
-        self._sticker_polys = None
+        self._projection = CubeProjection(self.cube, self._view)
+        self._polys = None
         self._labels = None
+        self._label_mode = labels  # see StickerLabels
+
+        # With blitting, the cube artists are animated: full draws leave
+        # them out, and the rest of the figure is kept as a background
+        # that each frame restores before drawing just the cube.
+        self._blit = blit and fig.canvas.supports_blit
+        self._background = None
+
+        # View changes from the mouse and arrow keys are gathered into one
+        # pending rotation and zoom, which a timer renders at most fps
+        # times a second.  Events that arrive between two renders are
+        # merged and their frames counted as dropped.  fps=None renders
+        # every event at once.  fps='auto' is 30 on canvases whose timers
+        # run, and None on those whose timers never fire (Agg and the
+        # other non-interactive backends), where nothing would be drawn.
+        self._timer = None
+        if fps == 'auto':
+            self._timer = fig.canvas.new_timer(interval=int(1000 / 30))
+            fps = 30
+            if type(self._timer) is TimerBase:
+                self._timer = fps = None
+        elif fps:
+            self._timer = fig.canvas.new_timer(interval=int(1000 / fps))
+        if self._timer is not None:
+            self._timer.add_callback(self._render_pending)
+        self.fps = fps
+        self.frames_rendered = 0
+        self.frames_dropped = 0
+        self._pending_rot = None
+        self._pending_zoom = None
+        self._frames = []  # queued animation frames; None is the real state
+        self._timer_running = False
 
         self._draw_cube()
 
@@ -467,6 +944,8 @@ class InteractiveCube(plt.Axes):
                                        self._key_press)
         self.figure.canvas.mpl_connect('key_release_event',
                                        self._key_release)
+        self.figure.canvas.mpl_connect('draw_event', self._on_draw)
+        self.figure.canvas.mpl_connect('resize_event', self._on_resize)
 
         self._initialize_widgets()
 
@@ -512,73 +991,150 @@ class InteractiveCube(plt.Axes):
     def _project(self, pts):
         return project_points(pts, self._current_rot, self._view, [0, 1, 0])
 
-    def _draw_cube(self):
-        stickers = self._project(self.cube._stickers)[:, :, :2]
-        faces = self._project(self.cube._faces)[:, :, :2]
-        face_centroids = self._project(self.cube._face_centroids[:, :3])
-        sticker_centroids = self._project(self.cube._sticker_centroids[:, :3])
-
-        plastic_color = self.cube.plastic_color
-        colors = np.asarray(self.cube.face_colors)[self.cube._colors]
-        face_zorders = -face_centroids[:, 2]
-        sticker_zorders = -sticker_centroids[:, 2]
-
-        if self._face_polys is None:
-            # initial call: create polygon objects and add to axes
-            self._face_polys = []
-            self._sticker_polys = []
-            self._labels = []
-
-            index = 1
-
-            for i in range(len(colors)):
-                fp = plt.Polygon(faces[i], facecolor=plastic_color,
-                                 zorder=face_zorders[i])
-                sp = plt.Polygon(stickers[i], facecolor=colors[i],
-                                 zorder=sticker_zorders[i])
-
-                #lb = self.figure.text(0.2, 0.2 + i * .05, str(i), size=10)
-                lb = self.annotate(translateid(i + 1), xy=sticker_centroids[i][:2], textcoords='data')
-
-                self._face_polys.append(fp)
-                self._sticker_polys.append(sp)
-                self._labels.append(lb)
-                self.add_patch(fp)
-                self.add_patch(sp)
-                
+    def _draw_cube(self, frame=None):
+        verts, facecolors, edgecolors, sticker_centroids, visible = (
+            self._projection.polygons(self._current_rot, frame))
+        K = len(sticker_centroids)
+
+        if self._polys is None:
+            # initial call: create the collection and the labels
+            self._polys = PolyCollection(verts, linewidths=0.5,
+                                         animated=self._blit)
+            self.add_collection(self._polys)
+            self._labels = StickerLabels(self, self.cube.N, self._label_mode,
+                                         animated=self._blit)
         else:
-            # subsequent call: update the polygon objects
-            for i in range(len(colors)):
-                self._face_polys[i].set_xy(faces[i])
-                self._face_polys[i].set_zorder(face_zorders[i])
-                self._face_polys[i].set_facecolor(plastic_color)
-
-                self._sticker_polys[i].set_xy(stickers[i])
-                self._sticker_polys[i].set_zorder(sticker_zorders[i])
-                self._sticker_polys[i].set_facecolor(colors[i])
+            self._polys.set_verts(verts)
+
+        self._polys.set_facecolor(facecolors)
+        self._polys.set_edgecolor(edgecolors)
+
+        # Only stickers facing the viewer show their label, since the
+        # labels are all drawn above the collection.
+        self._labels.update(sticker_centroids, visible)
+
+        self._refresh()
+        self.frames_rendered += 1
+
+    def _cube_artists(self):
+        return [self._polys] + self._labels.artists()
+
+    def _refresh(self):
+        """Show the cube artists, blitting them over the saved background
+        when possible and redrawing the whole figure otherwise."""
+        canvas = self.figure.canvas
+        if self._background is None:
+            canvas.draw()
+            return
+
+        canvas.restore_region(self._background)
+        for artist in self._cube_artists():
+            self.draw_artist(artist)
+        canvas.blit(self.bbox)
+
+    def _on_draw(self, event):
+        # A full draw (first show, resize, widgets) leaves out the animated
+        # cube artists: keep what it drew as the background, then add them.
+        if not self._blit or self._polys is None:
+            return
+        if not self._polys.get_animated():
+            return
+
+        canvas = self.figure.canvas
+        self._background = canvas.copy_from_bbox(self.bbox)
+        for artist in self._cube_artists():
+            self.draw_artist(artist)
+        canvas.blit(self.bbox)
+
+    def _on_resize(self, event):
+        # The saved background no longer fits; the redraw that follows a
+        # resize captures a new one.
+        self._background = None
+
+    def _set_animated(self, animated):
+        for artist in self._cube_artists():
+            artist.set_animated(animated)
 
-                #self._labels[i].set_position((sticker_centroids[i][0], sticker_centroids[i][1]))
-
-                self._labels[i].set_position(sticker_centroids[i][:2])
-                self._labels[i].set_zorder(face_zorders[i] + .1)
+    def rotate(self, rot):
+        self._current_rot = self._current_rot * rot
 
+    def _queue_view(self, rot=None, zoom=None):
+        """Add a view rotation and/or zoom factor to the pending change."""
+        if self._pending_rot is not None or self._pending_zoom is not None:
+            self.frames_dropped += 1
 
-        self.figure.canvas.draw()
+        if rot is not None:
+            if self._pending_rot is None:
+                self._pending_rot = rot
+            else:
+                self._pending_rot = self._pending_rot * rot
+        if zoom is not None:
+            self._pending_zoom = zoom * (self._pending_zoom or 1)
 
-    def rotate(self, rot):
-        self._current_rot = self._current_rot * rot
+        if self._timer is None:
+            self._render_pending()
+        else:
+            self._start_timer()
+
+    def _start_timer(self):
+        if not self._timer_running:
+            self._timer_running = True
+            self._timer.start()
+
+    def _render_pending(self):
+        """Apply the pending view change and draw it, along with the next
+        animation frame if there is one; timer callback."""
+        if (self._pending_rot is None and self._pending_zoom is None
+                and not self._frames):
+            if self._timer is not None:
+                self._timer.stop()
+            self._timer_running = False
+            return
+
+        if self._pending_rot is not None:
+            self.rotate(self._pending_rot)
+        if self._pending_zoom is not None:
+            factor = self._pending_zoom
+            xlim = self.get_xlim()
+            ylim = self.get_ylim()
+            self.set_xlim(factor * xlim[0], factor * xlim[1])
+            self.set_ylim(factor * ylim[0], factor * ylim[1])
+        self._pending_rot = None
+        self._pending_zoom = None
+
+        if self._frames:
+            self._draw_cube(self._frames.pop(0))
+        else:
+            self._draw_cube()
 
     def rotate_face(self, face, turns=1, layer=0, steps=5):
-        if not np.allclose(turns, 0):
-            for i in range(steps):
-                self.cube.rotate_face(face, turns * 1. / steps,
-                                      layer=layer)
-                self._draw_cube()
+        if np.allclose(turns, 0):
+            return
+
+        # The move is made at once; the frames leading up to it are only
+        # for show.  With a timer they play at fps, after any frames still
+        # queued, and the queue ends with a draw of the actual state.
+        frames = self.cube.turn_frames(face, turns, layer, steps)
+        self.cube.rotate_face(face, turns, layer=layer)
+        mask, frames = frames[0], frames[1:]
+        frames = [(mask,) + tuple(x[i] for x in frames)
+                  for i in range(steps - 1)]
+
+        if self._timer is None:
+            for frame in frames:
+                self._draw_cube(frame)
+            self._draw_cube()
+            return
+
+        self._frames = self._frames[:-1] + frames + [None]
+        self._start_timer()
 
     def _reset_view(self, *args):
         self.set_xlim(self._start_xlim)
         self.set_ylim(self._start_ylim)
         self._current_rot = self._start_rot
+        self._pending_rot = None
+        self._pending_zoom = None
         self._draw_cube()
 
     def _solve_cube(self, *args):
@@ -587,6 +1143,7 @@ class InteractiveCube(plt.Axes):
             self.rotate_face(face, -n, layer, steps=3)
         self.cube._move_list = []
         self.ops_text.set_text("")
+        self.figure.canvas.draw_idle()
 
     def _key_press(self, event):
         """Handler for key press events"""
@@ -594,26 +1151,32 @@ class InteractiveCube(plt.Axes):
             self._shift = True
         elif event.key.isdigit():
             self._digit_flags[int(event.key)] = 1
+        elif event.key == 't':
+            self._labels.toggle()
         elif event.key == 'right':
             if self._shift:
                 ax_LR = self._ax_LR_alt
             else:
                 ax_LR = self._ax_LR
-            self.rotate(Quaternion.from_v_theta(ax_LR,
-                                                5 * self._step_LR))
+            self._queue_view(Quaternion.from_v_theta(ax_LR,
+                                                     5 * self._step_LR))
+            return
         elif event.key == 'left':
             if self._shift:
                 ax_LR = self._ax_LR_alt
             else:
                 ax_LR = self._ax_LR
-            self.rotate(Quaternion.from_v_theta(ax_LR,
-                                                -5 * self._step_LR))
+            self._queue_view(Quaternion.from_v_theta(ax_LR,
+                                                     -5 * self._step_LR))
+            return
         elif event.key == 'up':
-            self.rotate(Quaternion.from_v_theta(self._ax_UD,
-                                                5 * self._step_UD))
+            self._queue_view(Quaternion.from_v_theta(self._ax_UD,
+                                                     5 * self._step_UD))
+            return
         elif event.key == 'down':
-            self.rotate(Quaternion.from_v_theta(self._ax_UD,
-                                                -5 * self._step_UD))
+            self._queue_view(Quaternion.from_v_theta(self._ax_UD,
+                                                     -5 * self._step_UD))
+            return
         elif event.key.upper() in 'LRUDBF':
             if self._shift:
                 direction = -1
@@ -629,7 +1192,8 @@ class InteractiveCube(plt.Axes):
             oc = Cube(self.cube.N)
             perm = self.cube.match(oc)
             print(perm_to_string(perm), " = ", perm)
-                
+            return
+
         self._draw_cube()
 
     def find_generators(self, *args):
@@ -685,49 +1249,22 @@ class InteractiveCube(plt.Axes):
         for seq in sequences:
             print(seq)
 
-    def apply_string(self, s):
-        
-        trans_table = { 
-            'f' : "F",
-            'b' : "B",
-            'l' : "L",
-            'r' : "R",
-            't' : "U",
-            'e' : "D",
-            }
-        
-        for op in s.split(" * "):
-            if op[0] == '(':
-                face = op[1] #trans_table[op[1]]
-                count = 1
-                dir = -1
-            else:                
-                face = op[0] # trans_table[op[0]]
-                if len(op) > 1:
-                    count = int(op[1])
-                else:
-                    count = 1
-                dir = 1
-                
-            print("Applying {0} : {1} {2} times".format(face, dir, count))
-            for i in range(count):
-                self.cube.rotate_face(face, dir)
+        group = PermGroup(face_generators(self.cube.N))
+        print("Group order: {0}".format(group.order()))
 
+    def apply_string(self, s):
+        for face, dir in parse_ops(s):
+            print("Applying {0} : {1}".format(face, dir))
+            self.cube.rotate_face(face, dir)
 
     def apply_opps(self, *args):
         
         self._solve_cube();
-        ops = [ 
-		        "L * (B)^-1 * L * (B)^-1 * (R)^-1 * (U)^-1 * R * B2 * L2 * D * F * D * F * (D)^-1 * (F)^-1 * (D)^-1",
-		        "F * (D)^-1 * F * D * (F)^-1 * R2 * (D)^-1 * (B)^-1 * D * B * R2 * D * F * D2 * (F)^-1 * D * (F)^-1",
-		        "F * R * F * (R)^-1 * (D)^-1 * (F)^-1 * L * D * (L)^-1 * D * L * D2 * (L)^-1 * D2 * F * D * R * (F)^-1 * (R)^-1 * D2 * (F)^-1 * (D)^-1 * F * (D)^-1 * (F)^-1 * D2",
-		        "(D)^-1 * F * D * (F)^-1 * R2 * (D)^-1 * (B)^-1 * D * B * R2 * D * F * D2 * (F)^-1 * D",
-		        "F * R * F * (R)^-1 * (F)^-1 * L * F2 * (D)^-1 * (F)^-1 * R * (F)^-1 * (R)^-1 * (L)^-1",
-		        "F * B2 * D * (F)^-1 * (D)^-1 * B2 * D2 * (R)^-1 * (D)^-1 * F * (D)^-1 * (F)^-1",
-		        "F * D * R * F * (R)^-1 * (D)^-1 * (F)^-1 * D * F * D * (F)^-1 * D * F * D * (F)^-1"            
-               ]
-
-        s = ops[self.current_op]
+        # The next sequence is drawn and saved straight away, so the solve
+        # is not animated.
+        self._frames = []
+
+        s = opps[self.current_op]
         self.apply_string(s)
                 
         self._draw_cube()
@@ -740,9 +1277,9 @@ class InteractiveCube(plt.Axes):
         
         fname = "{0}Opp{1}.png".format(self.cube.N, self.current_op)
         print("Save to file ", fname)
-        plt.savefig(fname)
+        self._savefig(fname)
         
-        self.current_op = (self.current_op + 1) % len(ops)
+        self.current_op = (self.current_op + 1) % len(opps)
         self._btn_apply_ops.label._text = 'Opp {0}'.format(self.current_op)
         
         print("--------------------------------------------------------------")
@@ -750,9 +1287,26 @@ class InteractiveCube(plt.Axes):
         print(perm_string, " = ", perm)
         
     def save_image(self, *args):
-         plt.savefig("Image{0}.png".format(self.image_count))
+         self._savefig("Image{0}.png".format(self.image_count))
          self.image_count += 1
 
+    def _skip_frames(self):
+        """Drop the animation frames still queued and draw the state they
+        lead to."""
+        if self._frames:
+            self._frames = []
+            self._draw_cube()
+
+    def _savefig(self, fname):
+        # savefig leaves out animated artists, so draw the cube normally;
+        # the full redraw afterwards also shows any changed text.
+        self._skip_frames()
+        self._set_animated(False)
+        self.figure.savefig(fname)
+        self._set_animated(self._blit)
+        self._background = None
+        self._refresh()
+
     def _key_release(self, event):
         """Handler for key release event"""
         if event.key == 'shift':
@@ -782,6 +1336,7 @@ class InteractiveCube(plt.Axes):
             dx = event.x - self._event_xy[0]
             dy = event.y - self._event_xy[1]
             self._event_xy = (event.x, event.y)
+            rot = zoom = None
 
             if self._button1:
                 if self._shift:
@@ -792,29 +1347,26 @@ class InteractiveCube(plt.Axes):
                                                self._step_UD * dy)
                 rot2 = Quaternion.from_v_theta(ax_LR,
                                                self._step_LR * dx)
-                self.rotate(rot1 * rot2)
-
-                self._draw_cube()
+                rot = rot1 * rot2
 
             if self._button2:
-                factor = 1 - 0.003 * (dx + dy)
-                xlim = self.get_xlim()
-                ylim = self.get_ylim()
-                self.set_xlim(factor * xlim[0], factor * xlim[1])
-                self.set_ylim(factor * ylim[0], factor * ylim[1])
+                zoom = 1 - 0.003 * (dx + dy)
 
-                self.figure.canvas.draw()
+            self._queue_view(rot, zoom)
+
+        elif event.inaxes is self:
+            if self._labels.hover(event.xdata, event.ydata):
+                self._refresh()
 
 if __name__ == '__main__':
     import sys
-    global N
-    
+
     try:
         N = int(sys.argv[1])
     except:
         N = 3
 
-    c = Cube(N)
+    c = Cube(N, logical=True)
 
     # do a 3-corner swap
     #c.rotate_face('R')
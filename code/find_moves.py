@@ -2,6 +2,14 @@
 # Experimental code to look for combinations that make interesting moves.
 # E.g. swap corners and the like.
 
+import json
+import os
+import time
+
+import numpy as np
+
+import perm_rank
+
 
 moves = [
     (('F', 1), [0, 1, 15, 14, 4, 5, 11, 10, 8, 9, 2, 3, 12, 13, 6, 7, 16, 17, 18, 19, 21, 23, 20, 22]),
@@ -67,60 +75,835 @@ def is_twist(perm):
     return False
 
 
-def explore(cur, max_path, current_best_score, current_best_path):
+def _search_state(path):
+    # The successors key for a path of move descriptions: the last move
+    # and how many times in a row it has been made.
+    if not path or path[-1] not in move_index:
+        return None
+
+    run = 1
+    while run < len(path) and path[-1 - run] == path[-1]:
+        run += 1
+
+    return (move_index[path[-1]], run)
+
+
+def print_hit(path_len, score, path, perm):
+    print(path_len, score, path, perm)
+
+
+class Search:
+    """A depth-first search for the interesting sequences below cur.
+
+    cur is a (path, perm) pair.  Only canonical sequences are expanded (see
+    successors), and the permutation, its inverse and the fixed-point
+    count are updated in place from the 12 entries each move changes.
+    The walk keeps its own stack instead of recursing, so hits() can hand
+    them out one at a time and the search can be saved and resumed.
+
+    on_leaf, if given, is called with (path, perm) for every node that
+    would be expanded but sits at max_path, so a caller can carry on from
+    there.
+
+    visited may be a perm_rank.NibbleTable.  It records the shallowest
+    depth at which each permutation was reached, and a permutation
+    reached again strictly deeper than that is skipped along with its
+    subtree.  A transposition at the same depth is still expanded: it
+    can end in a different move, and so allow successors the first
+    path did not.  Depths past 14 are neither recorded nor pruned.  The
+    table is not saved in checkpoints; a resumed search starts a fresh
+    one.
+
+    budget is a limit in wall-clock seconds.  When it runs out hits()
+    stops early and finished stays False.  If checkpoint names a file the
+    search is saved there every `interval` seconds and when it stops, and
+    Search.resume(checkpoint) picks up exactly where it left off.
+    progress, if given, is called as progress(nodes, nodes_per_second)
+    every `interval` seconds.
+
+    best_score and best_path track the most fixed points seen short of the
+    identity, and the first (path, perm) that reached it.
+    """
+    def __init__(self, cur, max_path, best_score=0, best_path=None,
+                 on_leaf=None, visited=None, budget=None, checkpoint=None,
+                 interval=60., progress=None):
+        self.root = (list(cur[0]), list(cur[1]))
+        self.path = list(cur[0])
+        self.perm = list(cur[1])
+        self.inv = inverse(self.perm)
+        self.max_path = max_path
+        self.best_score = best_score
+        self.best_path = best_path
+        self.on_leaf = on_leaf
+        self.visited = visited
+        self.budget = budget
+        self.checkpoint = checkpoint
+        self.interval = interval
+        self.progress = progress
+        self.nodes = 0
+        self.finished = False
+
+        # One frame per expanded node: its successors, how many of them
+        # have been tried, its score and the changes that led to it.
+        if len(self.path) < max_path:
+            self._stack = [[successors[_search_state(self.path)], 0,
+                            score_list(self.perm), None]]
+        else:
+            self._stack = []
+
+    def _apply(self, m, score):
+        # Make move m in place; return the undo list and the new score.
+        perm, inv = self.perm, self.inv
+        desc, l = moves[m]
+
+        changed = [(inv[v], v, l[v]) for v in supports[m]]
+        for j, v, w in changed:
+            score += (w == j) - (v == j)
+        for j, v, w in changed:
+            perm[j] = w
+            inv[w] = j
+        self.path.append(desc)
+        self.nodes += 1
+
+        return changed, score
+
+    def _undo(self, changed):
+        perm, inv = self.perm, self.inv
+        self.path.pop()
+        for j, v, w in changed:
+            perm[j] = v
+            inv[v] = j
+
+    def save(self, fname):
+        """Write the search position and best-so-far state to fname."""
+        state = dict(root=self.root, max_path=self.max_path,
+                     positions=[frame[1] for frame in self._stack],
+                     best_score=self.best_score, best_path=self.best_path,
+                     nodes=self.nodes, finished=self.finished)
+        tmp = fname + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, fname)
+
+    @classmethod
+    def resume(cls, fname, **kwargs):
+        """Rebuild a search saved by save(); kwargs are as for __init__."""
+        with open(fname) as f:
+            state = json.load(f)
+
+        def tuples(path):
+            return [tuple(desc) for desc in path]
+
+        root = (tuples(state['root'][0]), state['root'][1])
+        best_path = state['best_path']
+        if best_path is not None:
+            best_path = (tuples(best_path[0]), best_path[1])
+        kwargs.setdefault('checkpoint', fname)
+
+        search = cls(root, state['max_path'], state['best_score'], best_path,
+                     **kwargs)
+        search.finished = state['finished']
+        if search.finished:
+            search._stack = []
+
+        # Replay the move each unfinished frame was exploring.
+        positions = state['positions']
+        for k, i in enumerate(positions):
+            frame = search._stack[-1]
+            frame[1] = i
+            if k + 1 < len(positions):
+                m, run = frame[0][i - 1]
+                changed, score = search._apply(m, frame[2])
+                search._stack.append([successors[(m, run)], 0, score,
+                                      changed])
+        search.nodes = state['nodes']
+
+        return search
+
+    def hits(self):
+        """Yield (path_len, score, path, perm) for each interesting node."""
+        path, perm = self.path, self.perm
+        max_path = self.max_path
+
+        if not self._stack:
+            if not self.finished and self.on_leaf is not None:
+                self.on_leaf(list(path), list(perm))
+            self.finished = True
+            return
+
+        started = time.monotonic()
+        last_report = started
+        last_nodes = self.nodes
+        next_check = self.nodes + 4096
+
+        stack = self._stack
+        while stack:
+            if self.nodes >= next_check:
+                next_check = self.nodes + 4096
+                now = time.monotonic()
+                if self.budget is not None and now - started >= self.budget:
+                    if self.checkpoint is not None:
+                        self.save(self.checkpoint)
+                    return
+                if now - last_report >= self.interval:
+                    if self.progress is not None:
+                        rate = (self.nodes - last_nodes) / (now - last_report)
+                        self.progress(self.nodes, rate)
+                    if self.checkpoint is not None:
+                        self.save(self.checkpoint)
+                    last_report = now
+                    last_nodes = self.nodes
+
+            frame = stack[-1]
+            options, i, score, _ = frame
+            if i == len(options):
+                stack.pop()
+                if frame[3] is not None:
+                    self._undo(frame[3])
+                continue
+            frame[1] = i + 1
 
-    path = cur[0]
+            m, run = options[i]
+            path_len = len(path)
+            changed, next_score = self._apply(m, score)
 
-    path_len = len(path)
-    if (path_len >= max_path):
-        return (current_best_score, current_best_path)
-    perm = cur[1]
+            if self.visited is not None and len(path) <= 14:
+                r = perm_rank.rank(perm)
+                if self.visited[r] < len(path):
+                    self._undo(changed)
+                    continue
+                self.visited[r] = len(path)
+
+            expand = True
+            if next_score < 24 and next_score > self.best_score:
+                self.best_score = next_score
+                self.best_path = (list(path), list(perm))
+
+            if next_score >= 12 and next_score < 24:
+                if top_correct(perm) == False:
+                    expand = False
+                elif next_score == 12 and is_twist(perm):
+                    expand = False
+                else:
+                    yield (path_len, next_score, list(path), list(perm))
+
+            if expand and len(path) < max_path:
+                stack.append([successors[(m, run)], 0, next_score, changed])
+                continue
 
-    for  desc, l in moves:
+            if expand and self.on_leaf is not None:
+                self.on_leaf(list(path), list(perm))
+            self._undo(changed)
 
-        global best_pair
-        global best_score
+        self.finished = True
+        if self.checkpoint is not None:
+            self.save(self.checkpoint)
 
-        next_path = path.copy()
-        next_path.append(desc)
 
-        next_l = apply_list(perm, l)
+def iter_explore(cur, max_path, **kwargs):
+    """A generator over the hits explore would report."""
+    return Search(cur, max_path, **kwargs).hits()
 
-        score = score_list(next_l)
 
-        if score < 24 and score > current_best_score:
-            best_score = score
-            best_path = (next_path, next_l)
-        else:
-            best_score = current_best_score
-            best_path = current_best_path
+def explore(cur, max_path, current_best_score, current_best_path,
+            report=print_hit, **kwargs):
+    """Report the interesting sequences that extend cur up to max_path moves.
+
+    Each hit is passed to report(path_len, score, path, perm); any of the
+    sinks in search_sinks.py will do.  The other keyword arguments are
+    passed to Search, so explore(..., budget=600, checkpoint='run.json')
+    gives up after ten minutes with the best found so far, and
+    resume_explore('run.json') carries on from there.
+
+    Returns (best_score, best_path).
+    """
+    search = Search(cur, max_path, current_best_score, current_best_path,
+                    **kwargs)
+    for hit in search.hits():
+        report(*hit)
+
+    return (search.best_score, search.best_path)
+
+
+def resume_explore(checkpoint, report=print_hit, **kwargs):
+    """Carry on with a search explore saved to checkpoint."""
+    search = Search.resume(checkpoint, **kwargs)
+    for hit in search.hits():
+        report(*hit)
+
+    return (search.best_score, search.best_path)
+
+
+def print_progress(nodes, rate):
+    print("{0} nodes, {1:.0f} nodes/s".format(nodes, rate))
+
 
-        if score >= 12 and score < 24:
+def cycles(perm):
+    """The cycles of perm longer than one entry."""
+    seen = [False] * len(perm)
+    result = []
+    for start in range(len(perm)):
+        if seen[start] or perm[start] == start:
+            continue
+        orbit = []
+        point = start
+        while not seen[point]:
+            seen[point] = True
+            orbit.append(point)
+            point = perm[point]
+        result.append(orbit)
+
+    return result
+
+
+# Iterative-deepening A*
+#
+# Every entry of a permutation moves independently of the others: a move
+# l sends the value v to l[v].  The values held by any set of entries
+# therefore make up a smaller puzzle of their own, and the fewest moves
+# that solve the smaller puzzle never overestimate the moves needed for
+# the whole one.  The pattern tables below solve such smaller puzzles
+# exactly by breadth-first search.
+
+faces = 'UDLRBF'
+opposite = dict(U='D', D='U', L='R', R='L', B='F', F='B')
+
+
+def _canonical_runs():
+    # For each face, the shortest run of quarter turns that gives each net
+    # turn, preferring clockwise when two runs are equally short.
+    runs = {}
+    for face in faces:
+        dirs = sorted((desc[1] for desc, l in moves if desc[0] == face),
+                      reverse=True)
+        best = {}
+        for n in range(1, 4):
+            for d in dirs:
+                t = (d * n) % 4
+                if t != 0 and t not in best:
+                    best[t] = (d, n)
+        runs[face] = set(best.values())
+
+    return runs
+
+
+def _successors():
+    # successors[(last, run)] lists (move index, run) pairs that may follow
+    # a run of `run` copies of moves[last].  This skips inverse
+    # cancellations (F' F), runs with a shorter equivalent (U U U, or
+    # U' U' in place of U U) and one order of each commuting pair of
+    # opposite faces (D U is dropped in favour of U D).
+    runs = _canonical_runs()
+    states = [None] + [(m, n) for m in range(len(moves)) for n in range(1, 4)]
+
+    table = {}
+    for state in states:
+        nxt = []
+        for m, (desc, l) in enumerate(moves):
+            face, d = desc
+            if state is None:
+                nxt.append((m, 1))
+                continue
 
-            if top_correct(next_l) == False:
+            last, run = state
+            last_face, last_d = moves[last][0]
+            if face == last_face:
+                if d == last_d and (d, run + 1) in runs[face]:
+                    nxt.append((m, run + 1))
+            elif (face == opposite[last_face]
+                  and faces.index(face) < faces.index(last_face)):
                 continue
+            else:
+                nxt.append((m, 1))
+        table[state] = nxt
+
+    return table
+
+successors = _successors()
+move_index = dict((desc, m) for m, (desc, l) in enumerate(moves))
+
+# The entries each move changes.
+supports = [[v for v in range(24) if l[v] != v] for desc, l in moves]
+
+
+def _corner_groups():
+    # The three stickers of a corner are turned by the same three faces.
+    groups = {}
+    for j in range(24):
+        key = frozenset(desc[0] for desc, l in moves if l[j] != j)
+        groups.setdefault(key, []).append(j)
+
+    return sorted(groups.values())
+
+corners = _corner_groups()
+corner_of = [None] * 24
+for c, stickers in enumerate(corners):
+    for j in stickers:
+        corner_of[j] = c
+
+# The same moves acting on corner numbers rather than sticker numbers.
+corner_moves = [[corner_of[l[stickers[0]]] for stickers in corners]
+                for desc, l in moves]
+
+
+def inverse(perm):
+    res = [0] * len(perm)
+    for i, v in enumerate(perm):
+        res[v] = i
+
+    return res
+
+
+_pattern_tables = {}
+
+def pattern_table(goal_key, actions):
+    """Distances to goal_key of every key reachable from it.
+
+    A key is a tuple of values and actions lists, per move, where that move
+    sends each value.  The table is built by breadth-first search backwards
+    from goal_key and cached.
+    """
+    cache_key = (goal_key, tuple(map(tuple, actions)))
+    if cache_key in _pattern_tables:
+        return _pattern_tables[cache_key]
+
+    backwards = [inverse(a) for a in actions]
+    dist = {goal_key: 0}
+    frontier = [goal_key]
+    depth = 0
+    while frontier:
+        depth += 1
+        nxt = []
+        for key in frontier:
+            for b in backwards:
+                prev = tuple([b[v] for v in key])
+                if prev not in dist:
+                    dist[prev] = depth
+                    nxt.append(prev)
+        frontier = nxt
+
+    _pattern_tables[cache_key] = dist
+    return dist
+
+
+def make_heuristic(fixed, target=None):
+    """Return a lower bound on the moves left before perm[i] == target[i]
+    for every i in fixed.
+
+    One sticker of a corner fixes where that corner is and how it is
+    twisted, so the pinned stickers are reduced to one per target corner,
+    preferring the one whose target is that corner's first sticker; every
+    fully pinned target then shares the same tables.  Those are looked up
+    four corners at a time in position-and-twist tables (at most
+    24*21*18*15 keys each), and when every corner is pinned also in a
+    table of corner positions alone (8! keys).  The bound is the largest
+    of the lookups.
+    """
+    if target is None:
+        target = identity
+
+    reps = {}
+    for i in fixed:
+        c = corner_of[target[i]]
+        if c not in reps or target[i] == corners[c][0]:
+            reps[c] = i
+    entries = [reps[c] for c in sorted(reps)]
+
+    tables = []
+    sticker_actions = [l for desc, l in moves]
+    for k in range(0, len(entries), 4):
+        chunk = entries[k:k + 4]
+        goal_key = tuple(target[i] for i in chunk)
+        tables.append((chunk, None, pattern_table(goal_key, sticker_actions)))
+
+    if len(entries) == len(corners):
+        goal_key = tuple(corner_of[target[i]] for i in entries)
+        tables.append((entries, corner_of,
+                       pattern_table(goal_key, corner_moves)))
+
+    unreachable = 99
+
+    def heuristic(perm):
+        h = 0
+        for chunk, relabel, dist in tables:
+            if relabel is None:
+                key = tuple([perm[i] for i in chunk])
+            else:
+                key = tuple([relabel[perm[i]] for i in chunk])
+            d = dist.get(key, unreachable)
+            if d > h:
+                h = d
+
+        return h
+
+    return heuristic
+
+
+def is_interesting(perm):
+    # The filter explore applies before it prints a sequence.
+    score = score_list(perm)
+    if score < 12 or score >= 24:
+        return False
+
+    if top_correct(perm) == False:
+        return False
+
+    if score == 12 and is_twist(perm):
+        return False
+
+    return True
+
 
-            if score == 12:
-                b = is_twist(next_l)
-                if (b):
-                    #print("This is a twist only.")
+def is_corner_swap(perm):
+    # The U face is in place and exactly two corners have traded places,
+    # however they are twisted.
+    for i in range(4):
+        if perm[i] != i:
+            return False
+
+    cp = [corner_of[perm[stickers[0]]] for stickers in corners]
+    moved = [c for c in range(len(cp)) if cp[c] != c]
+
+    return len(moved) == 2 and cp[cp[moved[0]]] == moved[0]
+
+
+def ida_search(goal, max_depth, fixed=(), start=None, target=None):
+    """Find a shortest move sequence whose permutation satisfies goal.
+
+    goal is a predicate on permutations.  fixed lists the entries goal
+    needs to match target (the identity by default) and drives the
+    pattern-table heuristic; with no entries the search degrades to
+    iterative deepening.  For example
+
+        ida_search(is_corner_swap, 14, fixed=range(4))
+
+    looks for a swap of two D corners that leaves the U face alone.
+
+    Returns (path, perm) or None if nothing is found within max_depth.
+    """
+    if start is None:
+        start = identity
+
+    h = make_heuristic(fixed, target)
+    path = []
+    found = None
+
+    def search(perm, g, bound, state):
+        nonlocal found
+
+        f = g + h(perm)
+        if f > bound:
+            return f
+
+        if goal(perm):
+            found = (list(path), perm)
+            return f
+
+        next_bound = None
+        for m, run in successors[state]:
+            desc, l = moves[m]
+            path.append(desc)
+            b = search(apply_list(perm, l), g + 1, bound, (m, run))
+            path.pop()
+
+            if found is not None:
+                return b
+            if next_bound is None or b < next_bound:
+                next_bound = b
+
+        return next_bound
+
+    bound = h(start)
+    while bound <= max_depth:
+        bound = search(start, 0, bound, None)
+        if found is not None:
+            return found
+
+    return None
+
+
+# Bidirectional search
+#
+# To make a known target, grow one tree forwards from the identity and
+# another backwards from the target with the inverse moves, and stop when
+# they share a permutation.  Each tree only has to reach half the depth.
+
+def perm_from_string(s):
+    """The permutation made by a sequence written like the ops in
+    InteractiveCube.apply_opps, e.g. "F * (D)^-1 * R2 * (B)^-1"."""
+    lookup = dict(moves)
+    perm = identity
+    for op in s.split(" * "):
+        if op[0] == '(':
+            face = op[1]
+            count = -1
+        else:
+            face = op[0]
+            if len(op) > 1:
+                count = int(op[1])
+            else:
+                count = 1
+
+        for i in range(count % 4):
+            perm = apply_list(perm, lookup[(face, 1)])
+
+    return perm
+
+
+def _trace(seen, key):
+    # Follow the parent links in seen back to the root.
+    steps = []
+    while seen[key] is not None:
+        key, m = seen[key]
+        steps.append(m)
+
+    return steps
+
+
+def bidirectional_search(target, max_depth):
+    """Find a shortest move sequence whose permutation is target.
+
+    Both frontiers live in dicts keyed by the permutation packed into
+    bytes, mapping each to its parent key and the move that led to it.
+    The smaller frontier is grown a whole layer at a time, and the first
+    layer that touches the other tree gives the shortest total length.
+
+    Returns (path, perm) or None if the sequence needs more than
+    max_depth moves.
+    """
+    start = bytes(identity)
+    goal = bytes(target)
+    forward = {start: None}
+    backward = {goal: None}
+    ahead = [start]
+    behind = [goal]
+    forwards = [l for desc, l in moves]
+    backwards = [inverse(l) for l in forwards]
+
+    meet = start if start == goal else None
+    depth = 0
+    while meet is None and depth < max_depth and ahead and behind:
+        depth += 1
+        grow_forward = len(ahead) <= len(behind)
+        if grow_forward:
+            frontier, seen, other, tables = ahead, forward, backward, forwards
+        else:
+            frontier, seen, other, tables = behind, backward, forward, backwards
+
+        nxt = []
+        for key in frontier:
+            for m, l in enumerate(tables):
+                child = bytes([l[v] for v in key])
+                if child in seen:
                     continue
+                seen[child] = (key, m)
+                nxt.append(child)
+                if meet is None and child in other:
+                    meet = child
+
+        if grow_forward:
+            ahead = nxt
+        else:
+            behind = nxt
+
+    if meet is None:
+        return None
+
+    steps = _trace(forward, meet)[::-1] + _trace(backward, meet)
+    return ([moves[m][0] for m in steps], list(target))
 
-            print (path_len, score, next_path, next_l)
 
+# Parallel search
+#
+# explore's subtrees are independent, so the tree is cut at a fixed depth
+# and the subtrees below the cut are shared out between processes.
 
-        new_best_score, new_best_path = explore((next_path, next_l), max_path, best_score, current_best_path)
+def path_order(path):
+    # Serial explore visits nodes in the lexicographic order of their move
+    # indices, with a path before its extensions.
+    return tuple(move_index.get(desc, -1) for desc in path)
 
-    return (new_best_score, new_best_path)
 
-best_score, best_path = explore(([moves[0][0]], moves[0][1]), 8, 0, (['base'], moves[0][1]))
+def _explore_subtree(args):
+    leaf, max_path = args
+    hits = []
+    best_score, best_path = explore(leaf, max_path, 0, None,
+                                    report=lambda *hit: hits.append(hit))
 
-print("Complete")
-print(best_score, best_path)
+    return (hits, best_score, best_path)
 
 
+def parallel_explore(cur, max_path, prefix_depth=2, workers=None,
+                     report=print_hit):
+    """explore, with the subtrees below prefix_depth moves past cur run on
+    a ProcessPoolExecutor of `workers` processes.
 
+    Hits from all processes are sorted into the order serial explore
+    would report them, and ties for the best score go to the path serial
+    explore would reach first, so the output does not depend on how the
+    work was scheduled.
 
+    Returns (best_score, best_path) as explore does.
+    """
+    from concurrent.futures import ProcessPoolExecutor
 
+    hits = []
+    leaves = []
+    cut = min(len(cur[0]) + prefix_depth, max_path)
+    best_score, best_path = explore(cur, cut, 0, None,
+                                    report=lambda *hit: hits.append(hit),
+                                    on_leaf=lambda *leaf: leaves.append(leaf))
+    results = [(best_score, best_path)]
 
+    if cut < max_path and leaves:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = [(leaf, max_path) for leaf in leaves]
+            for sub_hits, sub_score, sub_path in pool.map(_explore_subtree,
+                                                          jobs):
+                hits.extend(sub_hits)
+                results.append((sub_score, sub_path))
 
+    hits.sort(key=lambda hit: path_order(hit[2]))
+    for hit in hits:
+        report(*hit)
+
+    best_score = max(score for score, path in results)
+    if best_score <= 0:
+        return (0, None)
+    best_path = min((path for score, path in results if score == best_score),
+                    key=lambda path: path_order(path[0]))
+
+    return (best_score, best_path)
+
+
+# Layer-at-a-time search with numpy
+#
+# A whole breadth-first layer is held as a (K, 24) uint8 array and all 11
+# moves are applied to it with one fancy-indexing call.  States are keyed
+# by perm_rank.rank_rows, and the states already seen are one bit each in
+# a perm_rank.BitSet.
+
+move_array = np.array([l for desc, l in moves], dtype=np.uint8)
+
+
+def _twists():
+    # is_twist(perm) asks whether one, two or three clockwise turns of
+    # some face take perm to the identity.
+    rows = []
+    for desc, l in moves:
+        if desc[1] < 0:
+            continue
+        power = identity
+        for k in range(3):
+            power = apply_list(power, l)
+            rows.append(inverse(power))
+
+    return perm_rank.rank_rows(np.array(rows, dtype=np.uint8))
+
+twist_keys = _twists()
+
+
+def score_rows(layer):
+    return (layer == np.arange(24, dtype=np.uint8)).sum(1)
+
+
+def interesting_rows(layer, scores=None, keys=None):
+    # is_interesting for every row of layer at once.
+    if scores is None:
+        scores = score_rows(layer)
+    if keys is None:
+        keys = perm_rank.rank_rows(layer)
+    top = (layer[:, :12] == np.arange(12, dtype=np.uint8)).all(1)
+    twist = (scores == 12) & np.isin(keys, twist_keys)
+
+    return top & (scores >= 12) & (scores < 24) & ~twist
+
+
+def explore_layers(cur, max_path, report=print_hit, chunk=1 << 18):
+    """Breadth-first counterpart of explore.
+
+    Every permutation is visited once, at the depth of its shortest
+    extension of cur, so each is reported at most once, and nodes are not
+    pruned the way explore prunes high scores that fail top_correct.
+    Rows are expanded `chunk` at a time to bound memory.
+
+    Returns (best_score, best_path), the first best in breadth-first order.
+    """
+    path0 = list(cur[0])
+    layer = np.array([cur[1]], dtype=np.uint8)
+    visited = perm_rank.BitSet()
+    visited.add_many(perm_rank.rank_rows(layer))
+    parents = []
+    best_score, best_path = 0, None
+
+    def trace(depth, row):
+        steps = []
+        for d in range(depth, 0, -1):
+            parent, via = parents[d - 1]
+            steps.append(moves[via[row]][0])
+            row = parent[row]
+
+        return path0 + steps[::-1]
+
+    for depth in range(1, max_path - len(path0) + 1):
+        children, parent, via = [], [], []
+        for lo in range(0, len(layer), chunk):
+            block = layer[lo:lo + chunk]
+            k = len(block)
+            kids = np.take(move_array, block, axis=1).reshape(-1, 24)
+            kid_keys, first = np.unique(perm_rank.rank_rows(kids),
+                                        return_index=True)
+            first = first[~visited.contains_many(kid_keys)]
+            children.append(kids[first])
+            parent.append(lo + first % k)
+            via.append(first // k)
+
+        layer = np.concatenate(children)
+        parent = np.concatenate(parent)
+        via = np.concatenate(via)
+
+        # Later chunks may repeat states found by earlier ones.
+        keys, first = np.unique(perm_rank.rank_rows(layer), return_index=True)
+        first.sort()
+        layer, parent, via = layer[first], parent[first], via[first]
+        if len(layer) == 0:
+            break
+        parents.append((parent, via))
+        keys = perm_rank.rank_rows(layer)
+        visited.add_many(keys)
+
+        scores = score_rows(layer)
+        short = np.where(scores < 24, scores, -1)
+        top = short.argmax()
+        if short[top] > best_score:
+            best_score = int(short[top])
+            best_path = (trace(depth, top), layer[top].tolist())
+
+        for row in np.flatnonzero(interesting_rows(layer, scores, keys)):
+            path = trace(depth, row)
+            report(len(path) - 1, int(scores[row]), path, layer[row].tolist())
+
+    return (best_score, best_path)
+
+
+if __name__ == '__main__':
+    import sys
+
+    start = ([moves[0][0]], moves[0][1])
+    if len(sys.argv) > 1 and sys.argv[1].endswith('.json'):
+        # Save to, or carry on from, a checkpoint file.
+        if os.path.exists(sys.argv[1]):
+            best_score, best_path = resume_explore(sys.argv[1],
+                                                   progress=print_progress)
+        else:
+            best_score, best_path = explore(start, 8, 0, None,
+                                            checkpoint=sys.argv[1],
+                                            progress=print_progress)
+    elif len(sys.argv) > 1:
+        best_score, best_path = parallel_explore(start, 8,
+                                                 workers=int(sys.argv[1]))
+    else:
+        best_score, best_path = explore(start, 8, 0, (['base'], moves[0][1]))
+
+    print("Complete")
+    print(best_score, best_path)
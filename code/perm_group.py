@@ -0,0 +1,128 @@
+"""
+Permutation groups
+------------------
+A permutation of n points is a tuple p where p[i] is where point i goes.
+Products are taken left to right: (a * b)[i] = b[a[i]], i.e. apply a,
+then b.
+
+PermGroup builds a base and strong generating set with the Schreier-Sims
+algorithm, in the form given by Knuth ("Efficient representation of perm
+groups", 1991).  Once built, membership and order queries are cheap:
+
+    g = PermGroup(face_generators(3))    # from cube_interactive.py
+    g.order()                            # 43252003274489856000
+    g.contains(perm)                     # is perm reachable?
+    g.stabilizer([0, 1, 2]).order()
+"""
+
+
+def mul(a, b):
+    """Apply a, then b."""
+    return tuple([b[x] for x in a])
+
+
+def inv(a):
+    res = [0] * len(a)
+    for i, x in enumerate(a):
+        res[x] = i
+
+    return tuple(res)
+
+
+class PermGroup:
+    """The group generated by a list of permutations.
+
+    Parameters
+    ----------
+    generators : list of sequences
+        permutations of range(n)
+    degree : int
+        n; only needed when there are no generators
+    base : list of int
+        points to put first in the base, in order.  The stabilizer of
+        these points is then read directly off the chain.
+    """
+    def __init__(self, generators, degree=None, base=()):
+        generators = [tuple(g) for g in generators]
+        if degree is None:
+            degree = len(generators[0])
+        self.degree = degree
+        self.identity = tuple(range(degree))
+
+        base = list(base)
+        self.base = base + [i for i in range(degree) if i not in set(base)]
+
+        # transversals[k][j] takes base[k] to j and fixes base[:k];
+        # strong[k] holds the strong generators that first act at level k.
+        self.transversals = [{b: self.identity} for b in self.base]
+        self.strong = [[] for b in self.base]
+
+        for g in generators:
+            self._add(0, g)
+
+    def _sift(self, k, g):
+        # Strip g through the levels from k down; the identity is left
+        # exactly when g lies in the stabilizer chain's group at level k.
+        for level in range(k, self.degree):
+            j = g[self.base[level]]
+            t = self.transversals[level].get(j)
+            if t is None:
+                return g
+            if j != self.base[level]:
+                g = mul(g, inv(t))
+
+        return g
+
+    def _add(self, k, g):
+        if self._sift(k, g) == self.identity:
+            return
+
+        self.strong[k].append(g)
+        for t in list(self.transversals[k].values()):
+            self._extend(k, mul(t, g))
+
+    def _extend(self, k, g):
+        point = self.base[k]
+        work = [g]
+        while work:
+            g = work.pop()
+            j = g[point]
+            t = self.transversals[k].get(j)
+            if t is None:
+                self.transversals[k][j] = g
+                work.extend(mul(g, s) for s in self.strong[k])
+            else:
+                h = mul(g, inv(t))
+                if h != self.identity:
+                    self._add(k + 1, h)
+
+    def order(self):
+        n = 1
+        for t in self.transversals:
+            n *= len(t)
+
+        return n
+
+    def contains(self, perm):
+        """True if perm is in the group."""
+        perm = tuple(perm)
+        if len(perm) != self.degree:
+            return False
+
+        return self._sift(0, perm) == self.identity
+
+    def strong_generators(self, k=0):
+        """The strong generators of the stabilizer of base[:k]."""
+        return [g for level in self.strong[k:] for g in level]
+
+    def stabilizer(self, points):
+        """The subgroup that fixes each of points."""
+        points = list(points)
+        if self.base[:len(points)] == points:
+            group = self
+        else:
+            group = PermGroup(self.strong_generators(), self.degree,
+                              base=points)
+
+        gens = group.strong_generators(len(points))
+        return PermGroup(gens, self.degree, base=group.base)
@@ -0,0 +1,157 @@
+# Ranking of 2x2 sticker permutations, as used by find_moves.py.
+#
+# A reachable permutation is fixed by where each corner went and how it
+# was twisted.  The corner positions are ranked by their Lehmer code
+# (8! ways) and the twists of the first seven corners as a base-3 number
+# (3^7 ways; the last twist follows because the twists always sum to 0
+# mod 3).  Every one of the 8! * 3^7 = 88,179,840 states the moves table
+# can reach gets its own number, so a visited set is one bit per state.
+# (The 3,674,160 usually quoted for the 2x2 holds one corner still; these
+# moves turn all six faces, which adds the 24 orientations of the cube.)
+
+import numpy as np
+
+
+# The stickers of each corner: the U/D sticker first, then the other two
+# in the order a clockwise twist of the corner carries them.
+corners = [(0, 9, 17), (1, 19, 13), (2, 21, 11), (3, 15, 23),
+           (4, 16, 8), (5, 12, 18), (6, 10, 20), (7, 22, 14)]
+
+corner_of = [None] * 24
+twist_of = [None] * 24
+for c, stickers in enumerate(corners):
+    for t, j in enumerate(stickers):
+        corner_of[j] = c
+        twist_of[j] = t
+
+n_orientations = 3 ** 7
+n_states = 40320 * n_orientations
+
+_factorials = [5040, 720, 120, 24, 6, 2, 1, 1]
+
+
+def corner_state(perm):
+    """The slot and twist of every corner of perm."""
+    slots = []
+    twists = []
+    for stickers in corners:
+        v = perm[stickers[0]]
+        slots.append(corner_of[v])
+        twists.append(twist_of[v])
+
+    return slots, twists
+
+
+def rank(perm):
+    """A number in range(n_states) that identifies perm."""
+    slots, twists = corner_state(perm)
+
+    r = 0
+    for i in range(8):
+        smaller = 0
+        for j in range(i + 1, 8):
+            if slots[j] < slots[i]:
+                smaller += 1
+        r += smaller * _factorials[i]
+
+    o = 0
+    for t in twists[:7]:
+        o = 3 * o + t
+
+    return r * n_orientations + o
+
+
+def unrank(r):
+    """The permutation that rank maps to r."""
+    r, o = divmod(r, n_orientations)
+
+    twists = [0] * 8
+    for i in range(6, -1, -1):
+        o, twists[i] = divmod(o, 3)
+    twists[7] = -sum(twists[:7]) % 3
+
+    free = list(range(8))
+    slots = []
+    for i in range(8):
+        k, r = divmod(r, _factorials[i])
+        slots.append(free.pop(k))
+
+    perm = [None] * 24
+    for c, stickers in enumerate(corners):
+        home = corners[slots[c]]
+        for k, j in enumerate(stickers):
+            perm[j] = home[(k + twists[c]) % 3]
+
+    return perm
+
+
+_refs = [stickers[0] for stickers in corners]
+_corner_array = np.array(corner_of, dtype=np.int64)
+_twist_array = np.array(twist_of, dtype=np.int64)
+_powers = 3 ** np.arange(6, -1, -1, dtype=np.int64)
+
+
+def rank_rows(layer):
+    """rank for every row of a (K, 24) array of permutations."""
+    values = layer[:, _refs]
+    slots = _corner_array[values]
+
+    r = np.zeros(len(layer), dtype=np.int64)
+    for i in range(7):
+        smaller = (slots[:, i + 1:] < slots[:, i:i + 1]).sum(1)
+        r += smaller * _factorials[i]
+
+    o = (_twist_array[values[:, :7]] * _powers).sum(1)
+
+    return r * n_orientations + o
+
+
+class BitSet:
+    """A set of ranks held as one bit each in a bytearray."""
+    def __init__(self, size=n_states):
+        self.size = size
+        self.data = bytearray((size + 7) // 8)
+        self.bits = np.frombuffer(self.data, dtype=np.uint8)
+
+    def __contains__(self, i):
+        return (self.data[i >> 3] >> (i & 7)) & 1 == 1
+
+    def add(self, i):
+        """Add i, returning True if it was not already there."""
+        byte = self.data[i >> 3]
+        mask = 1 << (i & 7)
+        if byte & mask:
+            return False
+        self.data[i >> 3] = byte | mask
+        return True
+
+    def contains_many(self, ranks):
+        return (self.bits[ranks >> 3] >> (ranks & 7).astype(np.uint8)) & 1 == 1
+
+    def add_many(self, ranks):
+        np.bitwise_or.at(self.bits, ranks >> 3,
+                         (1 << (ranks & 7)).astype(np.uint8))
+
+    def __len__(self):
+        return int(np.unpackbits(self.bits).sum())
+
+
+class NibbleTable:
+    """A number from 0 to 14 per rank, four bits each; 15 means unset.
+
+    Depth-limited searches use it to remember the shallowest depth at
+    which they expanded each state.
+    """
+    unset = 15
+
+    def __init__(self, size=n_states):
+        self.size = size
+        self.data = bytearray(b'\xff' * ((size + 1) // 2))
+
+    def __getitem__(self, i):
+        return (self.data[i >> 1] >> (4 * (i & 1))) & 15
+
+    def __setitem__(self, i, value):
+        shift = 4 * (i & 1)
+        byte = self.data[i >> 1]
+        self.data[i >> 1] = (byte & ~(15 << shift) & 255) | (value << shift)
@@ -1,3 +1,5 @@
+import functools
+
 import numpy as np
 
 class Quaternion:
@@ -110,6 +112,36 @@ class Quaternion:
         return np.dot(points, M.T)
 
 
+@functools.lru_cache(maxsize=256)
+def _turn_matrix(v, turns):
+    c = np.cos(turns * np.pi / 2)
+    s = np.sin(turns * np.pi / 2)
+    if turns == round(turns):
+        # whole quarter turns: make the entries exactly 0 and +-1
+        c, s = np.round(c), np.round(s)
+
+    v = np.array(v, dtype=float)
+    v /= np.sqrt(np.dot(v, v))
+    K = np.array([[0, -v[2], v[1]],
+                  [v[2], 0, -v[0]],
+                  [-v[1], v[0], 0]])
+    # same orientation as Quaternion.as_rotation_matrix
+    M = c * np.eye(3) - s * K + (1 - c) * np.outer(v, v)
+    M.flags.writeable = False
+    return M
+
+
+def turn_matrix(v, turns):
+    """Rotation matrix for `turns` quarter turns about the axis v.
+
+    Matrices are cached by (axis, turns), so repeated face turns and
+    animation steps reuse the same array instead of going through a
+    Quaternion each time.  Whole quarter turns come out exact.  The
+    result is read-only.
+    """
+    return _turn_matrix(tuple(float(x) for x in v), round(float(turns), 12))
+
+
 def project_points(points, q, view, vertical=[0, 1, 0]):
     """Project points using a quaternion q and a view v
 
@@ -0,0 +1,105 @@
+# Datasets of scrambled cubes, written straight to disk.
+#
+# A corpus is one or more shards.  Shard k of corpus `prefix` is three
+# files:
+#
+#     prefix-000k.states.npy   (count, 6, N, N) uint8 sticker colors
+#     prefix-000k.moves.npy    (count, length) move ids; move i is
+#                              CubeBatch.move_table(N)[0][i]
+#     prefix-000k.json         N, count, length, seed, shard and the
+#                              move list
+#
+# Every shard draws its moves from np.random.default_rng([seed, shard]),
+# all at once, and plays them in place on the memory-mapped states file,
+# a chunk at a time wrapped with CubeBatch.from_stickers.  So shards can
+# be made in parallel, and the same seed gives the same files, bit for
+# bit:
+#
+#     generate("corpus/3x3", 3, 1000000, 25, seed=1, shards=8)
+#     header, states, moves = load_shard("corpus/3x3", 0)
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from cube import Cube, CubeBatch
+
+
+def shard_name(prefix, shard):
+    return "{0}-{1:04d}".format(prefix, shard)
+
+
+def write_shard(prefix, N, count, length, seed, shard, chunk=65536):
+    """Write one shard of `count` scrambles of `length` moves each."""
+    name = shard_name(prefix, shard)
+    moves, table = CubeBatch.move_table(N)
+    dtype = np.uint8 if len(moves) <= 256 else np.uint16
+
+    rng = np.random.default_rng([seed, shard])
+    ids = open_memmap(name + ".moves.npy", "w+", dtype, (count, length))
+    ids[:] = rng.integers(len(moves), size=(count, length), dtype=dtype)
+
+    states = open_memmap(name + ".states.npy", "w+", np.uint8,
+                         (count, 6, N, N))
+    solved = Cube(N).stickers
+    for s in range(0, count, chunk):
+        block = states[s:s + chunk]
+        block[:] = solved
+        batch = CubeBatch.from_stickers(block, chunk)
+        for t in range(length):
+            batch.moves(ids[s:s + batch.K, t])
+    states.flush()
+    ids.flush()
+
+    header = dict(N=N, count=count, length=length, seed=seed, shard=shard,
+                  moves=[list(m) for m in moves])
+    with open(name + ".json", "w") as f:
+        json.dump(header, f)
+
+    return name
+
+
+def _write_shard(args):
+    return write_shard(*args)
+
+
+def generate(prefix, N, count, length, seed=0, shards=1, workers=None):
+    """
+    Write `shards` shards of `count` scrambles each, spread over
+    `workers` processes (None for one per CPU, 1 for this process).
+    Returns the shard names.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    jobs = [(prefix, N, count, length, seed, k) for k in range(shards)]
+    if workers == 1:
+        return [_write_shard(job) for job in jobs]
+
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(_write_shard, jobs))
+
+
+def load_shard(prefix, shard):
+    """The header, states and move ids of a shard; the arrays are
+    read-only memory maps."""
+    name = shard_name(prefix, shard)
+    with open(name + ".json") as f:
+        header = json.load(f)
+
+    return (header, np.load(name + ".states.npy", mmap_mode="r"),
+            np.load(name + ".moves.npy", mmap_mode="r"))
+
+
+if __name__ == '__main__':
+    import sys
+
+    prefix, N, count, length = sys.argv[1:5]
+    seed = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+    shards = int(sys.argv[6]) if len(sys.argv) > 6 else 1
+    for name in generate(prefix, int(N), int(count), int(length), seed,
+                         shards):
+        print(name)
@@ -0,0 +1,135 @@
+# Places to send the hits found by find_moves.explore.
+#
+# A sink is anything that can be called the way explore calls report:
+#
+#     sink(path_len, score, path, perm)
+#
+# The writers below buffer hits and write them out in batches, so a long
+# search can be piped into other tools without printing every hit.  Call
+# close() (or use them in a with block) to write out the last batch.
+
+import json
+
+import numpy as np
+
+from find_moves import cycles, move_index
+
+
+class JsonlSink:
+    """Write each hit as one line of JSON.
+
+    Each record holds depth, score, path (as [face, direction] pairs),
+    perm and cycles, the cycles of perm longer than one entry.
+    """
+    def __init__(self, out, batch=1000):
+        if isinstance(out, str):
+            self.out = open(out, 'w')
+            self._owned = True
+        else:
+            self.out = out
+            self._owned = False
+        self.batch = batch
+        self.count = 0
+        self._lines = []
+
+    def __call__(self, path_len, score, path, perm):
+        record = dict(depth=path_len, score=score,
+                      path=[list(desc) for desc in path],
+                      perm=list(perm), cycles=cycles(perm))
+        self._lines.append(json.dumps(record))
+        self.count += 1
+        if len(self._lines) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self.out.write("\n".join(self._lines) + "\n")
+            self._lines = []
+        self.out.flush()
+
+    def close(self):
+        self.flush()
+        if self._owned:
+            self.out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def hit_dtype(max_moves=16):
+    """The record layout BinarySink writes; moves past the path are 255."""
+    return np.dtype([('depth', np.uint8), ('score', np.uint8),
+                     ('length', np.uint8), ('moves', np.uint8, (max_moves,)),
+                     ('perm', np.uint8, (24,))])
+
+
+class BinarySink:
+    """Write hits as fixed-size records of hit_dtype(max_moves).
+
+    Moves are stored as indices into find_moves.moves.  Read a file back
+    with np.fromfile(fname, dtype=hit_dtype(max_moves)).
+    """
+    def __init__(self, fname, batch=10000, max_moves=16):
+        self.out = open(fname, 'wb')
+        self.dtype = hit_dtype(max_moves)
+        self.max_moves = max_moves
+        self.count = 0
+        self._buffer = np.zeros(batch, dtype=self.dtype)
+        self._used = 0
+
+    def __call__(self, path_len, score, path, perm):
+        if len(path) > self.max_moves:
+            raise ValueError('path longer than {0} moves'.format(
+                self.max_moves))
+
+        record = self._buffer[self._used]
+        record['depth'] = path_len
+        record['score'] = score
+        record['length'] = len(path)
+        record['moves'] = 255
+        record['moves'][:len(path)] = [move_index.get(desc, 255)
+                                       for desc in path]
+        record['perm'] = perm
+        self._used += 1
+        self.count += 1
+        if self._used == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        self._buffer[:self._used].tofile(self.out)
+        self._used = 0
+        self.out.flush()
+
+    def close(self):
+        self.flush()
+        self.out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class HitLimit:
+    """Pass at most `limit` hits of each depth on to sink."""
+    def __init__(self, sink, limit):
+        self.sink = sink
+        self.limit = limit
+        self.counts = {}
+        self.dropped = 0
+
+    def __call__(self, path_len, score, path, perm):
+        n = self.counts.get(path_len, 0)
+        if n >= self.limit:
+            self.dropped += 1
+            return
+        self.counts[path_len] = n + 1
+        self.sink(path_len, score, path, perm)
+
+    def close(self):
+        if hasattr(self.sink, 'close'):
+            self.sink.close()
@@ -0,0 +1,30 @@
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+import batch_render
+import cube_interactive as ci
+
+
+def test_parse_ops():
+    assert ci.parse_ops("F * (D)^-1 * R2") == [('F', 1), ('D', -1),
+                                              ('R', 1), ('R', 1)]
+
+
+def test_render_batch_matches_serial(tmp_path):
+    jobs = [(n, s, None, str(tmp_path / "{0}Opp{1}.png".format(n, k)))
+            for n, s, _, k in [(2, ci.opps[4], None, 4),
+                               (3, ci.opps[0], None, 0),
+                               (3, [('R', 1, 1), ('U', -1, 0)], None, 9)]]
+    assert batch_render.render_batch(jobs, workers=2) == [j[3] for j in jobs]
+
+    images = [plt.imread(j[3]) for j in jobs]
+    serial = [j[:3] + (j[3] + '.serial.png',) for j in jobs]
+    batch_render.render_batch(serial, workers=1)
+    for image, job in zip(images, serial):
+        assert np.array_equal(image, plt.imread(job[3]))
+
+    # Different states give different images.
+    assert not np.array_equal(images[1][:, :, :3].mean(2),
+                              images[2][:, :, :3].mean(2))
@@ -0,0 +1,180 @@
+import random
+
+import numpy as np
+
+import cube
+
+
+def random_moves(rng, N, count):
+    return [(rng.choice("UDFBRL"), rng.randrange(N), rng.choice([-1, 1, 2, 3]))
+            for i in range(count)]
+
+
+def test_move_matches_strip_rotation():
+    rng = random.Random(0)
+    for N in (2, 3, 4, 5):
+        fast = cube.Cube(N)
+        slow = cube.Cube(N)
+        for f, l, d in random_moves(rng, N, 200):
+            fast.move(f, l, d)
+            slow._move_slow(f, l, d)
+            assert np.array_equal(fast.stickers, slow.stickers)
+
+
+def test_compiled_sequence_matches_moves():
+    rng = random.Random(1)
+    for N in (3, 4):
+        moves = random_moves(rng, N, 50)
+        one_by_one = cube.Cube(N)
+        for f, l, d in moves:
+            one_by_one.move(f, l, d)
+
+        fused = cube.Cube(N)
+        fused.apply(fused.compile(moves))
+        assert np.array_equal(fused.stickers, one_by_one.stickers)
+
+
+def test_turn_and_four_quarter_turns():
+    c = cube.Cube(4)
+    c.move("R", 1, 1)
+    start = c.stickers.copy()
+    for i in range(4):
+        c.turn("F", 1)
+    assert np.array_equal(c.stickers, start)
+
+    # a whole-cube turn leaves every face one color
+    c = cube.Cube(3)
+    c.turn("U", 1)
+    assert all(len(np.unique(face)) == 1 for face in c.stickers)
+
+
+def test_batch_matches_single_cubes():
+    rng = np.random.default_rng(2)
+    N, K = 3, 500
+    batch = cube.CubeBatch(N, K, chunk=64)
+    moves, table = batch.move_table(N)
+    singles = [cube.Cube(N) for k in range(K)]
+
+    for step in range(6):
+        ids = rng.integers(len(moves), size=K)
+        batch.moves(ids)
+        for c, i in zip(singles, ids):
+            c.move(*moves[i])
+
+    batch.move("R", 1, -1)
+    for c in singles:
+        c.move("R", 1, -1)
+
+    for k in range(K):
+        assert np.array_equal(batch.stickers[k], singles[k].stickers)
+
+
+def test_batch_predicates():
+    batch = cube.CubeBatch(2, 4)
+    batch.stickers[1] = cube.Cube(2).stickers
+    c = cube.Cube(2)
+    c.move("U", 0, 1)
+    batch.stickers[2] = c.stickers
+    c.turn("F", 1)
+    batch.stickers[3] = c.stickers
+    whole = cube.Cube(2)
+    whole.turn("R", 1)
+    batch.stickers[0] = whole.stickers
+
+    assert batch.solved().tolist() == [True, True, False, False]
+    assert batch.faces_solved()[2].tolist() == [True, True, False, False,
+                                               False, False]
+    counts = batch.color_counts()
+    assert (counts.sum(axis=2) == 4).all()
+    assert (counts.sum(axis=1) == 4).all()
+    assert counts[1].tolist() == (4 * np.eye(6, dtype=int)).tolist()
+
+
+def test_randomize_plays_drawn_moves():
+    np.random.seed(3)
+    c = cube.Cube(4)
+    c.randomize(40)
+
+    # the moves are drawn f, l, d for each move in turn, as they always
+    # have been, so a seed gives the same scramble as before
+    np.random.seed(3)
+    replay = cube.Cube(4)
+    for t in range(40):
+        f = cube.Cube.dictface[np.random.randint(6)]
+        l = np.random.randint(4)
+        d = 1 + np.random.randint(3)
+        replay.move(f, l, d)
+    assert np.array_equal(c.stickers, replay.stickers)
+
+
+def test_render_views_projection():
+    c = cube.Cube(3)
+    viewpoint = np.array([4., 4., 8.])
+    points = np.random.default_rng(4).normal(size=(5, 3))
+
+    # the per-point formula render_views has always used
+    v2 = np.dot(viewpoint, viewpoint)
+    zdir = viewpoint / np.sqrt(v2)
+    xdir = np.cross([0., 1., 0.], zdir)
+    xdir /= np.sqrt(np.dot(xdir, xdir))
+    ydir = np.cross(zdir, xdir)
+    for p, got in zip(points, c._render_points(points, viewpoint)):
+        dpoint = p - viewpoint
+        dproj = 0.5 * dpoint * v2 / np.dot(dpoint, -viewpoint)
+        assert np.allclose(got, [np.dot(xdir, dproj), np.dot(ydir, dproj),
+                                 np.dot(zdir, dpoint / np.sqrt(v2))])
+
+    corners = c._stickerpolygons(c.xdirs[2], np.cross(c.normals[2], c.xdirs[2]),
+                                 c.normals[2], 2. / 3)
+    assert corners.shape == (3, 3, 8, 3)
+    assert np.allclose(corners[..., 2], 1.)
+
+
+def test_render_views_one_collection_per_view():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    c = cube.Cube(4)
+    fig = c.render(flat=False)
+    ax = fig.axes[0]
+    assert len(ax.collections) == 3
+    assert [len(pc.get_paths()) for pc in ax.collections] == [3 * 17] * 3
+    plt.close(fig)
+
+
+def test_renderer_matches_render(tmp_path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    renderer = cube.CubeRenderer(3)
+    figure = renderer.figure
+    c = cube.Cube(3)
+    np.random.seed(7)
+    for m in range(3):
+        c.randomize(5)
+        renderer.save(c, str(tmp_path / 'renderer.png'))
+        fig = c.render()
+        fig.savefig(str(tmp_path / 'render.png'))
+        plt.close(fig)
+        assert np.array_equal(plt.imread(str(tmp_path / 'renderer.png')),
+                              plt.imread(str(tmp_path / 'render.png')))
+    assert renderer.figure is figure
+
+
+def test_renderer_streams_sequences(tmp_path):
+    from PIL import Image
+
+    def states(count):
+        c = cube.Cube(2)
+        for m in range(count):
+            yield c
+            c.move("R", 0, 1)
+
+    renderer = cube.CubeRenderer(2, flat=False)
+    names = renderer.write_pngs(states(3), str(tmp_path / 'f%02d.png'), dpi=40)
+    assert [n[-7:] for n in names] == ['f00.png', 'f01.png', 'f02.png']
+
+    fname = renderer.write_movie(states(5), str(tmp_path / 'f.gif'), dpi=40)
+    assert Image.open(fname).n_frames == 5
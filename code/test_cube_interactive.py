@@ -0,0 +1,381 @@
+import random
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+
+import cube_interactive as ci
+from perm_group import PermGroup
+
+
+def scrambled(N, count=20, seed=0):
+    rng = random.Random(seed)
+    cube = ci.Cube(N)
+    for i in range(count):
+        cube.rotate_face(rng.choice("UDLRBF"), rng.choice([1, -1]),
+                         layer=rng.randrange(N))
+
+    return cube
+
+
+def test_match_solved_is_identity():
+    for N in (2, 3, 5):
+        cube = ci.Cube(N)
+        assert cube.match(ci.Cube(N)) == list(range(1, 6 * N * N + 1))
+
+
+def test_match_agrees_with_tolerance_test():
+    for N in (2, 3, 4):
+        cube = scrambled(N, seed=N)
+        other = ci.Cube(N)
+        slow = [cube._match_slow(s, other) + 1 for s in range(6 * N * N)]
+        assert cube.match(other) == slow
+
+
+def test_match_partial_turn_has_no_partner():
+    cube = ci.Cube(3)
+    cube.rotate_face('U', 0.2)
+    assert cube.match(ci.Cube(3)) is None
+
+
+def test_face_generators_group_order():
+    assert PermGroup(ci.face_generators(2)).order() == 88179840
+    assert PermGroup(ci.face_generators(3)).order() == 43252003274489856000
+
+
+def test_logical_cube_matches_geometry():
+    rng = random.Random(5)
+    for N in (2, 3, 4):
+        geometric = ci.Cube(N)
+        logical = ci.Cube(N, logical=True)
+        for i in range(25):
+            move = (rng.choice("UDLRBF"), rng.choice([1, -1, 2]),
+                    rng.randrange(N))
+            geometric.rotate_face(*move)
+            logical.rotate_face(*move)
+
+        assert logical._move_list == geometric._move_list
+        assert logical.match(ci.Cube(N)) == geometric.match(ci.Cube(N))
+        assert list(logical._perm + 1) == logical.match(ci.Cube(N))
+        assert np.allclose(logical._sticker_centroids,
+                           geometric._sticker_centroids, atol=1e-4)
+
+
+def test_logical_cube_transient_geometry():
+    cube = ci.Cube(3, logical=True)
+    cube.rotate_face('R', 1)
+    before = cube.match(ci.Cube(3))
+
+    cube._rotate_geometry('U', 0.4)
+    assert cube.match(ci.Cube(3)) == before
+
+    try:
+        cube.rotate_face('U', 0.5)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('fractional turn accepted')
+
+
+def test_turn_matrix_cached_and_exact():
+    from projection import turn_matrix
+
+    M = turn_matrix([0, 0, 1], 1)
+    assert M is turn_matrix((0., 0., 1.), 1.)
+    assert set(np.unique(M)) <= {-1., 0., 1.}
+    assert not M.flags.writeable
+
+    cube = ci.Cube(3)
+    start = cube._stickers.copy()
+    for i in range(4):
+        cube.rotate_face('R')
+    assert np.array_equal(cube._stickers, start)
+
+
+def test_draw_cube_single_collection():
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(5, 5))
+    ax = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig)
+    fig.add_axes(ax)
+    ax.rotate_face('R', steps=2)
+
+    # Three faces of the cube are in view from the start position, and
+    # only their faces and stickers are drawn.
+    assert ax._labels.visible.sum() == 3 * 9
+    assert len(ax.collections) == 1
+    assert len(ax._polys.get_paths()) == 2 * 27
+    plt.close(fig)
+
+
+def test_drag_blits_without_full_draw(tmp_path):
+    import matplotlib.pyplot as plt
+    from types import SimpleNamespace
+
+    fig = plt.figure(figsize=(5, 5))
+    ax = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig)
+    fig.add_axes(ax)
+    fig.canvas.draw()
+    assert ax._background is not None
+
+    full_draws = []
+    fig.canvas.mpl_connect('draw_event', full_draws.append)
+    ax._mouse_press(SimpleNamespace(x=100, y=100, button=1))
+    for i in range(5):
+        ax._mouse_motion(SimpleNamespace(x=100 + 10 * i, y=100))
+        ax._render_pending()
+    ax._mouse_release(SimpleNamespace(x=140, y=100, button=1))
+    assert full_draws == []
+
+    # A resize drops the background; the next full draw makes a new one.
+    ax._on_resize(None)
+    assert ax._background is None
+    fig.set_size_inches(6, 6)
+    fig.canvas.draw()
+    assert ax._background is not None
+
+    # Saved images still include the cube.
+    ax._savefig(str(tmp_path / 'cube.png'))
+    assert ax._polys.get_animated()
+    ax._polys.set_visible(False)
+    ax._savefig(str(tmp_path / 'empty.png'))
+    assert not np.array_equal(plt.imread(str(tmp_path / 'cube.png')),
+                              plt.imread(str(tmp_path / 'empty.png')))
+    plt.close(fig)
+
+
+def test_view_changes_are_coalesced():
+    import matplotlib.pyplot as plt
+    from types import SimpleNamespace
+
+    fig = plt.figure(figsize=(5, 5))
+    ax = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig, fps=30)
+    fig.add_axes(ax)
+    direct = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig,
+                                fps=None)
+
+    for a in (ax, direct):
+        a._mouse_press(SimpleNamespace(x=100, y=100, button=1))
+        for i in range(1, 11):
+            a._mouse_motion(SimpleNamespace(x=100 + 7 * i, y=100 - 3 * i))
+        a._key_press(SimpleNamespace(key='up'))
+
+    rendered = ax.frames_rendered
+    assert ax.frames_dropped == 10
+    ax._render_pending()
+    assert ax.frames_rendered == rendered + 1
+    assert direct.frames_dropped == 0
+
+    assert np.allclose(ax._current_rot.as_rotation_matrix(),
+                       direct._current_rot.as_rotation_matrix(), atol=1e-5)
+
+    # Nothing pending: the timer is stopped and nothing is drawn.
+    ax._render_pending()
+    assert ax.frames_rendered == rendered + 1
+    assert not ax._timer_running
+    plt.close(fig)
+
+
+def test_turn_frames_match_stepwise_rotation():
+    rng = random.Random(5)
+    cube = ci.Cube(4, logical=True)
+    for i in range(10):
+        cube.rotate_face(rng.choice("UDLRBF"), 1, rng.randrange(4))
+    mask, faces, stickers, face_centroids, sticker_centroids = (
+        cube.turn_frames('L', -1, 1, steps=4))
+    # only the 16 stickers of the inner layer are kept
+    assert mask.sum() == 16
+    assert stickers.shape == (4, 16, 9, 3)
+
+    for i in range(4):
+        step = ci.Cube(4, logical=True)
+        step._perm = cube._perm.copy()
+        step._unsynced[:] = True
+        step._rotate_geometry('L', -(i + 1) / 4., 1)
+        assert np.allclose(stickers[i], step._stickers[mask])
+        assert np.allclose(face_centroids[i],
+                           step._face_centroids[mask, :3])
+
+    # The last frame is where the turn leaves the stickers.
+    before = cube.match(ci.Cube(4))
+    cube.rotate_face('L', -1, 1)
+    cube._sync_geometry()
+    assert sorted(map(tuple, np.round(sticker_centroids[-1], 4))) == sorted(
+        map(tuple, np.round(cube._sticker_centroids[mask], 4)))
+    assert before != cube.match(ci.Cube(4))
+
+
+def test_animation_frames_play_from_timer():
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(5, 5))
+    ax = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig, fps=30)
+    fig.add_axes(ax)
+    ax.rotate_face('R', steps=4)
+    ax.rotate_face('U', -1, steps=4)
+
+    # The state moves at once; the frames wait for the timer.
+    expected = ci.Cube(3)
+    expected.rotate_face('R')
+    expected.rotate_face('U', -1)
+    assert ax.cube.match(ci.Cube(3)) == expected.match(ci.Cube(3))
+    assert len(ax._frames) == 3 + 3 + 1
+
+    rendered = ax.frames_rendered
+    while ax._frames:
+        ax._render_pending()
+    assert ax.frames_rendered == rendered + 7
+    plt.close(fig)
+
+
+def test_timerless_canvas_draws_at_once():
+    import matplotlib.pyplot as plt
+    from types import SimpleNamespace
+
+    # Agg's timers never fire, so nothing may wait for one.
+    fig = plt.figure(figsize=(5, 5))
+    ax = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig)
+    fig.add_axes(ax)
+    assert ax.fps is None
+
+    rendered = ax.frames_rendered
+    ax.rotate_face('R', steps=4)
+    assert ax._frames == []
+    assert ax.frames_rendered == rendered + 4
+    ax._key_press(SimpleNamespace(key='up'))
+    assert ax._pending_rot is None
+    assert ax.frames_rendered == rendered + 5
+    plt.close(fig)
+
+
+def test_culling_keeps_visible_stickers():
+    import batch_render
+
+    rng = random.Random(6)
+    cube = ci.Cube(3, logical=True)
+    for i in range(10):
+        cube.rotate_face(rng.choice("UDLRBF"), 1, rng.randrange(3))
+    frames = cube.turn_frames('F', 1, 0, steps=3)
+    cube._sync_geometry()
+
+    batch_render._setup()
+    fig = batch_render._figure
+    polys = fig.axes[0].collections[0]
+
+    def draw(rot, frame):
+        verts, colors, edges, centroids, visible = ci.cube_polygons(
+            cube, rot, frame=frame)
+        polys.set_verts(verts)
+        polys.set_facecolor(colors)
+        polys.set_edgecolor(edges)
+        fig.canvas.draw()
+        return np.asarray(fig.canvas.buffer_rgba()).astype(int), visible
+
+    facing = ci.facing
+    for trial in range(3):
+        rot = ci.Quaternion.from_v_theta(
+            [rng.uniform(-1, 1) for i in range(3)], rng.uniform(0, 6))
+        for frame in [None, (frames[0],) + tuple(x[1] for x in frames[1:])]:
+            culled, visible = draw(rot, frame)
+            assert visible.sum() <= 27 + 6
+            assert len(polys.get_paths()) < 2 * 54
+            try:
+                ci.facing = lambda frame, rot, view: np.ones(len(frame[3]),
+                                                             dtype=bool)
+                everything, visible = draw(rot, frame)
+            finally:
+                ci.facing = facing
+
+            # Only the cube's outline, stroked a little wider, differs.
+            changed = np.abs(culled - everything).max(2) > 40
+            assert changed.mean() < 0.005
+
+
+def test_projection_reprojects_only_changed_stickers():
+    rng = random.Random(8)
+    cube = ci.Cube(4, logical=True)
+    projection = ci.CubeProjection(cube)
+    rot = ci.Quaternion.from_v_theta((1, -1, 0), -np.pi / 6)
+
+    projection.polygons(rot)
+    seen = projection.projected
+    projection.polygons(rot)
+    assert projection.projected == 0
+
+    for i in range(10):
+        face, layer = rng.choice("UDLRBF"), rng.randrange(4)
+        frames = cube.turn_frames(face, 1, layer, steps=3)
+        cube.rotate_face(face, 1, layer)
+        projection.polygons(rot, (frames[0],) + tuple(x[0]
+                                                      for x in frames[1:]))
+        projection.polygons(rot)
+        assert 0 < projection.projected <= 4 * 4 + 4 * 3
+
+        # The cached result is what a fresh projection gives.
+        cached = projection.polygons(rot)
+        fresh = ci.cube_polygons(cube, rot)
+        for a, b in zip(cached[:3], fresh[:3]):
+            assert np.allclose(a, b)
+
+    rot = rot * ci.Quaternion.from_v_theta((0, 1, 0), 0.1)
+    projection.polygons(rot)
+    assert projection.projected == seen
+
+
+def test_label_modes():
+    import matplotlib.pyplot as plt
+    from types import SimpleNamespace
+
+    fig = plt.figure(figsize=(5, 5))
+    batched = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig)
+    # one path for all the labels, with a glyph per visible sticker
+    path = batched._labels._patch.get_path()
+    moves = (path.codes == ci.Path.MOVETO).sum()
+    assert moves >= 27
+
+    off = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig,
+                             labels='off')
+    assert len(off._labels._patch.get_path().vertices) == 1
+
+    ax = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig,
+                            labels='hover')
+    labels = ax._labels
+    i = np.flatnonzero(labels.visible)[0]
+    x, y = labels.centroids[i]
+    ax._mouse_motion(SimpleNamespace(inaxes=ax, xdata=x + 0.01, ydata=y))
+    assert labels.hover_index == i
+    assert labels._hover.get_visible()
+    assert labels._hover.get_text() == str(ci.translateid(i + 1, 3))
+
+    ax._mouse_motion(SimpleNamespace(inaxes=ax, xdata=1.9, ydata=1.9))
+    assert labels.hover_index is None
+    assert not labels._hover.get_visible()
+
+    ax._key_press(SimpleNamespace(key='t'))
+    assert len(labels._patch.get_path().vertices) == len(path.vertices)
+    plt.close(fig)
+
+
+def test_apply_opps_drops_queued_solve(tmp_path, monkeypatch):
+    import matplotlib.pyplot as plt
+
+    monkeypatch.chdir(tmp_path)
+    fig = plt.figure(figsize=(5, 5))
+    ax = ci.InteractiveCube(ci.Cube(3, logical=True), fig=fig, fps=30)
+    fig.add_axes(ax)
+    ax.rotate_face('R')
+    ax.rotate_face('U')
+    ax.apply_opps()
+
+    # Nothing is left for the timer to play over the saved state.
+    assert ax._frames == []
+    assert (tmp_path / '3Opp0.png').exists()
+    verts = ci.cube_polygons(ax.cube, ax._current_rot)[0]
+    assert np.allclose([p.vertices[:-1] for p in ax._polys.get_paths()],
+                       verts)
+
+    ax.rotate_face('F')
+    ax.save_image()
+    assert ax._frames == []
+    plt.close(fig)
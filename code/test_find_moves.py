@@ -0,0 +1,304 @@
+import random
+
+import pytest
+
+import find_moves as fm
+import perm_rank
+
+
+def backward_distances(depth):
+    # Exact distances to the identity, found by walking backwards from it.
+    backwards = [fm.inverse(l) for desc, l in fm.moves]
+    dist = {tuple(fm.identity): 0}
+    frontier = [fm.identity]
+    for d in range(1, depth + 1):
+        nxt = []
+        for perm in frontier:
+            for b in backwards:
+                prev = fm.apply_list(perm, b)
+                if tuple(prev) not in dist:
+                    dist[tuple(prev)] = d
+                    nxt.append(prev)
+        frontier = nxt
+
+    return dist
+
+
+@pytest.fixture(scope='module')
+def nearby():
+    return backward_distances(5)
+
+
+def test_corner_groups_follow_moves():
+    for desc, l in fm.moves:
+        for stickers in fm.corners:
+            assert len(set(fm.corner_of[l[j]] for j in stickers)) == 1
+
+
+def test_pattern_tables_consistent_with_moves():
+    fm.make_heuristic(range(24))
+    for goal_key, actions in [((0, 1, 2, 3), [l for desc, l in fm.moves]),
+                              (tuple(range(8)), fm.corner_moves)]:
+        dist = fm.pattern_table(goal_key, actions)
+        assert dist[goal_key] == 0
+        for key, d in random.Random(0).sample(sorted(dist.items()), 2000):
+            steps = [dist[tuple(a[v] for v in key)] for a in actions]
+            assert all(d <= s + 1 for s in steps)
+            if d > 0:
+                assert d - 1 in steps
+
+
+def test_heuristic_is_admissible(nearby):
+    h = fm.make_heuristic(range(24))
+    for perm, d in nearby.items():
+        assert h(list(perm)) <= d
+
+
+def test_heuristic_admissible_for_scrambles():
+    rng = random.Random(1)
+    for trial in range(5):
+        target = fm.identity
+        for i in range(30):
+            target = fm.apply_list(target, rng.choice(fm.moves)[1])
+        path, perm = fm.ida_search(lambda q: q == target, 14,
+                                   fixed=range(24), target=target)
+        h = fm.make_heuristic(range(24), target)
+        assert h(fm.identity) <= len(path)
+
+
+def test_ida_search_finds_shortest_path(nearby):
+    rng = random.Random(2)
+    for perm, d in rng.sample(sorted(nearby.items()), 50):
+        # nearby holds distances to the identity, so search from perm.
+        path, found = fm.ida_search(lambda q: q == fm.identity, 5,
+                                    fixed=range(24), start=list(perm))
+        assert len(path) == d
+
+        replay = list(perm)
+        lookup = dict(fm.moves)
+        for desc in path:
+            replay = fm.apply_list(replay, lookup[desc])
+        assert replay == found == fm.identity
+
+
+def test_ida_search_corner_swap():
+    path, perm = fm.ida_search(fm.is_corner_swap, 14, fixed=range(4))
+    assert fm.is_corner_swap(perm)
+
+    replay = fm.identity
+    lookup = dict(fm.moves)
+    for desc in path:
+        replay = fm.apply_list(replay, lookup[desc])
+    assert replay == perm
+
+
+def test_canonical_sequences_reach_every_state():
+    everything = {tuple(fm.identity)}
+    frontier = [fm.identity]
+    for depth in range(4):
+        frontier = [fm.apply_list(p, l) for p in frontier for desc, l in fm.moves]
+        everything.update(map(tuple, frontier))
+
+    canonical = {tuple(fm.identity)}
+    frontier = [(fm.identity, None)]
+    for depth in range(4):
+        frontier = [(fm.apply_list(p, fm.moves[m][1]), (m, run))
+                    for p, state in frontier
+                    for m, run in fm.successors[state]]
+        canonical.update(tuple(p) for p, state in frontier)
+
+    assert canonical == everything
+    assert len(frontier) < 11 ** 4 / 2
+
+
+def test_explore_best_path_replays(capsys):
+    start = ([fm.moves[0][0]], fm.moves[0][1])
+    best_score, (path, perm) = fm.explore(start, 5, 0, None)
+
+    replay = fm.identity
+    lookup = dict(fm.moves)
+    for desc in path:
+        replay = fm.apply_list(replay, lookup[desc])
+    assert replay == perm
+    assert fm.score_list(perm) == best_score < 24
+
+
+def test_perm_from_string():
+    assert fm.perm_from_string("(R)^-1") == dict(fm.moves)[('R', -1)]
+    assert fm.perm_from_string("F * (F)^-1") == fm.identity
+    assert fm.perm_from_string("U2 * U2") == fm.identity
+
+
+def test_bidirectional_search_matches_ida():
+    rng = random.Random(3)
+    lookup = dict(fm.moves)
+    for trial in range(5):
+        target = fm.identity
+        for i in range(30):
+            target = fm.apply_list(target, rng.choice(fm.moves)[1])
+
+        path, perm = fm.bidirectional_search(target, 14)
+        shortest, found = fm.ida_search(lambda q: q == target, 14,
+                                        fixed=range(24), target=target)
+        assert len(path) == len(shortest)
+
+        replay = fm.identity
+        for desc in path:
+            replay = fm.apply_list(replay, lookup[desc])
+        assert replay == perm == target
+
+    assert fm.bidirectional_search(fm.identity, 3) == ([], fm.identity)
+
+
+def test_parallel_explore_matches_serial(monkeypatch):
+    # Nothing this shallow has the top twelve stickers in place, so
+    # relax that test to get hits; the forked workers inherit the patch.
+    # Cutting at four moves leaves hits both above and below the cut,
+    # which only the merge puts back in serial order.
+    monkeypatch.setattr(fm, 'top_correct', lambda perm: True)
+    start = ([fm.moves[0][0]], fm.moves[0][1])
+    serial = []
+    expected = fm.explore(start, 6, 0, None,
+                          report=lambda *hit: serial.append(hit))
+
+    parallel = []
+    result = fm.parallel_explore(start, 6, prefix_depth=3, workers=2,
+                                 report=lambda *hit: parallel.append(hit))
+
+    assert result == expected
+    assert len(serial) > 100
+    assert parallel == serial
+
+
+def test_row_predicates_match_list_versions(nearby):
+    import numpy as np
+
+    perms = [list(p) for p in sorted(nearby)][:3000]
+    for desc, l in fm.moves:
+        power = fm.identity
+        for k in range(3):
+            power = fm.apply_list(power, l)
+            perms.append(fm.inverse(power))
+    layer = np.array(perms, dtype=np.uint8)
+
+    keys = perm_rank.rank_rows(layer)
+    assert len(np.unique(keys)) == len(set(map(tuple, perms)))
+    assert fm.score_rows(layer).tolist() == [fm.score_list(p) for p in perms]
+    assert (fm.interesting_rows(layer).tolist()
+            == [fm.is_interesting(p) for p in perms])
+    assert (np.isin(keys, fm.twist_keys).tolist()
+            == [fm.is_twist(p) for p in perms])
+
+
+def test_explore_layers_best_path_replays():
+    start = ([fm.moves[0][0]], fm.moves[0][1])
+    best_score, (path, perm) = fm.explore_layers(start, 6)
+    assert best_score == fm.explore(start, 6, 0, None)[0]
+
+    replay = fm.identity
+    lookup = dict(fm.moves)
+    for desc in path:
+        replay = fm.apply_list(replay, lookup[desc])
+    assert replay == perm
+    assert fm.score_list(perm) == best_score
+
+
+def test_rank_round_trips(nearby):
+    ranks = set()
+    for perm in sorted(nearby)[:2000]:
+        r = perm_rank.rank(perm)
+        assert 0 <= r < perm_rank.n_states
+        assert perm_rank.unrank(r) == list(perm)
+        ranks.add(r)
+    assert len(ranks) == min(len(nearby), 2000)
+
+    rng = random.Random(4)
+    for r in rng.sample(range(perm_rank.n_states), 200):
+        assert perm_rank.rank(perm_rank.unrank(r)) == r
+
+
+def test_rank_rows_matches_rank(nearby):
+    import numpy as np
+
+    perms = sorted(nearby)[:2000]
+    layer = np.array(perms, dtype=np.uint8)
+    assert perm_rank.rank_rows(layer).tolist() == [perm_rank.rank(p)
+                                                   for p in perms]
+
+
+def test_bitset_and_nibble_table():
+    import numpy as np
+
+    bits = perm_rank.BitSet(100)
+    assert bits.add(17) and not bits.add(17)
+    bits.add_many(np.array([3, 64, 99]))
+    assert 17 in bits and 64 in bits and 18 not in bits
+    assert bits.contains_many(np.array([3, 4, 99])).tolist() == [True, False,
+                                                                 True]
+    assert len(bits) == 4
+
+    depths = perm_rank.NibbleTable(10)
+    assert depths[5] == depths.unset
+    depths[5] = 3
+    depths[4] = 7
+    assert (depths[4], depths[5], depths[6]) == (7, 3, depths.unset)
+
+
+class RecordingTable(perm_rank.NibbleTable):
+    # A visited table that notes every state the search reaches; with
+    # prune=False it never reports a state as seen.
+    def __init__(self, prune):
+        perm_rank.NibbleTable.__init__(self)
+        self.prune = prune
+        self.reached = set()
+
+    def __getitem__(self, i):
+        if not self.prune:
+            return self.unset
+        return perm_rank.NibbleTable.__getitem__(self, i)
+
+    def __setitem__(self, i, value):
+        self.reached.add(i)
+        perm_rank.NibbleTable.__setitem__(self, i, value)
+
+
+def test_explore_with_visited_table():
+    start = ([fm.moves[0][0]], fm.moves[0][1])
+    plain = fm.Search(start, 7, visited=RecordingTable(prune=False))
+    list(plain.hits())
+    pruned = fm.Search(start, 7, visited=RecordingTable(prune=True))
+    list(pruned.hits())
+
+    assert pruned.nodes < plain.nodes
+    assert pruned.visited.reached == plain.visited.reached
+    assert pruned.best_score == plain.best_score
+
+
+def test_checkpoint_resume_matches_full_run(tmp_path):
+    start = ([fm.moves[0][0]], fm.moves[0][1])
+    full = fm.Search(start, 6)
+    list(full.hits())
+
+    fname = str(tmp_path / 'search.json')
+    search = fm.Search(start, 6, budget=0, checkpoint=fname)
+    list(search.hits())
+    assert not search.finished
+
+    rounds = 0
+    while not search.finished:
+        search = fm.Search.resume(fname, budget=0)
+        list(search.hits())
+        rounds += 1
+
+    assert rounds > 1
+    assert search.nodes == full.nodes
+    assert (search.best_score, search.best_path) == (full.best_score,
+                                                     full.best_path)
+
+
+def test_progress_reports_rate():
+    start = ([fm.moves[0][0]], fm.moves[0][1])
+    reports = []
+    fm.explore(start, 5, 0, None, interval=0,
+               progress=lambda nodes, rate: reports.append((nodes, rate)))
+    assert reports and all(rate > 0 for nodes, rate in reports)
@@ -0,0 +1,53 @@
+import itertools
+import math
+
+import find_moves as fm
+import perm_group as pg
+
+
+def test_symmetric_and_cyclic_orders():
+    n = 6
+    cycle = tuple(range(1, n)) + (0,)
+    swap = (1, 0) + tuple(range(2, n))
+    assert pg.PermGroup([cycle, swap]).order() == math.factorial(n)
+    assert pg.PermGroup([cycle]).order() == n
+
+    group = pg.PermGroup([cycle])
+    assert group.contains(pg.mul(cycle, cycle))
+    assert not group.contains(swap)
+
+
+def test_contains_every_element_of_small_group():
+    n = 4
+    group = pg.PermGroup([(1, 2, 0, 3), (0, 2, 3, 1)])   # A4
+    even = [p for p in itertools.permutations(range(n))
+            if sum(1 for i in range(n) for j in range(i) if p[j] > p[i]) % 2 == 0]
+    assert group.order() == 12
+    assert all(group.contains(p) for p in even)
+    assert sum(group.contains(p) for p in itertools.permutations(range(n))) == 12
+
+
+def test_two_by_two_group():
+    group = pg.PermGroup([l for desc, l in fm.moves])
+    assert group.order() == 8 * 7 * 6 * 5 * 4 * 3 * 2 * 3 ** 7
+
+    perm = fm.perm_from_string("R * U * (R)^-1 * (U)^-1")
+    assert group.contains(perm)
+
+    # Swapping two stickers of one corner is not a legal move.
+    twisted = list(fm.identity)
+    twisted[0], twisted[9] = twisted[9], twisted[0]
+    assert not group.contains(twisted)
+
+
+def test_stabilizer():
+    n = 5
+    cycle = tuple(range(1, n)) + (0,)
+    swap = (1, 0) + tuple(range(2, n))
+    group = pg.PermGroup([cycle, swap])
+    assert group.stabilizer([3]).order() == 24
+    assert group.stabilizer([4, 2]).order() == 6
+
+    stab = pg.PermGroup([l for desc, l in fm.moves]).stabilizer(range(4))
+    for g in stab.strong_generators():
+        assert all(g[i] == i for i in range(4))
@@ -0,0 +1,32 @@
+import numpy as np
+
+import cube
+import scramble_corpus
+
+
+def test_shards_replay_and_regenerate(tmp_path):
+    prefix = str(tmp_path / "a")
+    names = scramble_corpus.generate(prefix, 3, 300, 12, seed=7, shards=2,
+                                     workers=2)
+    assert names == [scramble_corpus.shard_name(prefix, k) for k in (0, 1)]
+
+    header, states, ids = scramble_corpus.load_shard(prefix, 1)
+    assert (header["N"], header["count"], header["length"]) == (3, 300, 12)
+    assert states.shape == (300, 6, 3, 3) and ids.shape == (300, 12)
+
+    moves = [tuple(m) for m in header["moves"]]
+    for k in (0, 150, 299):
+        c = cube.Cube(3)
+        for i in ids[k]:
+            c.move(*moves[i])
+        assert np.array_equal(states[k], c.stickers)
+
+    # Same seed, same bytes, even with another chunk size; another
+    # shard number gives other scrambles.
+    other = str(tmp_path / "b")
+    scramble_corpus.write_shard(other, 3, 300, 12, seed=7, shard=1, chunk=64)
+    again, states2, ids2 = scramble_corpus.load_shard(other, 1)
+    assert np.array_equal(states2, states) and np.array_equal(ids2, ids)
+
+    header0, states0, ids0 = scramble_corpus.load_shard(prefix, 0)
+    assert not np.array_equal(ids0, ids)
@@ -0,0 +1,102 @@
+import io
+import json
+
+import numpy as np
+
+import find_moves as fm
+import search_sinks
+
+
+def sample_hits():
+    lookup = dict(fm.moves)
+    hits = []
+    perm = fm.identity
+    path = []
+    for desc in [('R', 1), ('U', -1), ('F', 1), ('D', 1)]:
+        perm = fm.apply_list(perm, lookup[desc])
+        path = path + [desc]
+        hits.append((len(path) - 1, fm.score_list(perm), path, perm))
+
+    return hits
+
+
+def test_jsonl_sink_batches_and_records():
+    out = io.StringIO()
+    sink = search_sinks.JsonlSink(out, batch=3)
+    hits = sample_hits()
+    for hit in hits:
+        sink(*hit)
+    assert out.getvalue().count("\n") == 3
+    sink.close()
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert len(records) == len(hits)
+    for record, (path_len, score, path, perm) in zip(records, hits):
+        assert record['depth'] == path_len
+        assert record['score'] == score
+        assert [tuple(desc) for desc in record['path']] == path
+        assert record['perm'] == perm
+        assert record['cycles'] == fm.cycles(perm)
+        assert sum(len(c) for c in record['cycles']) == 24 - score
+
+
+def test_binary_sink_round_trip(tmp_path):
+    fname = str(tmp_path / 'hits.bin')
+    hits = sample_hits()
+    with search_sinks.BinarySink(fname, batch=2) as sink:
+        for hit in hits:
+            sink(*hit)
+
+    records = np.fromfile(fname, dtype=search_sinks.hit_dtype())
+    assert len(records) == len(hits)
+    for record, (path_len, score, path, perm) in zip(records, hits):
+        assert record['depth'] == path_len and record['score'] == score
+        moves = record['moves'][:record['length']]
+        assert [fm.moves[m][0] for m in moves] == path
+        assert record['perm'].tolist() == perm
+
+
+def test_hit_limit_per_depth():
+    kept = []
+    sink = search_sinks.HitLimit(lambda *hit: kept.append(hit), 1)
+    for hit in sample_hits() + sample_hits():
+        sink(*hit)
+    assert [hit[0] for hit in kept] == [0, 1, 2, 3]
+    assert sink.dropped == 4
+
+
+def relax_top_correct(monkeypatch):
+    # Nothing within a few moves has the top twelve stickers in place;
+    # without that test a shallow search has plenty of hits.
+    monkeypatch.setattr(fm, 'top_correct', lambda perm: True)
+
+
+def test_iter_explore_matches_explore(monkeypatch):
+    relax_top_correct(monkeypatch)
+    start = ([fm.moves[0][0]], fm.moves[0][1])
+    reported = []
+    fm.explore(start, 5, 0, None, report=lambda *hit: reported.append(hit))
+    assert len(reported) > 10
+    assert list(fm.iter_explore(start, 5)) == reported
+
+
+def test_explore_through_sinks(monkeypatch):
+    relax_top_correct(monkeypatch)
+    start = ([fm.moves[0][0]], fm.moves[0][1])
+    hits = list(fm.iter_explore(start, 6))
+
+    out = io.StringIO()
+    with search_sinks.JsonlSink(out, batch=7) as jsonl:
+        limit = search_sinks.HitLimit(jsonl, 20)
+        fm.explore(start, 6, 0, None, report=limit)
+
+    kept = []
+    counts = {}
+    for hit in hits:
+        counts[hit[0]] = counts.get(hit[0], 0) + 1
+        if counts[hit[0]] <= 20:
+            kept.append(hit)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert limit.dropped == len(hits) - len(kept) > 0
+    assert [(r['depth'], r['score'], [tuple(d) for d in r['path']], r['perm'])
+            for r in records] == kept